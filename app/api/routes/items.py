@@ -1,35 +1,60 @@
-from fastapi import APIRouter
+from typing import Optional
 
-from app.db import get_db
+from fastapi import APIRouter, Path, Query, Request
+
+from app import settings
+from app.common import problem as problems
+from app.common.conditional import ETAG_HEADER, etag, not_modified
+from app.common.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, row_id
+from app.common.responses import FastJSONResponse
+from app.db import ROW_ID_LIMIT, get_db
 from app.errors import ApiError
 
 router = APIRouter(tags=["items"])
 
+ITEM_ID = Path(..., ge=1, lt=ROW_ID_LIMIT)
+
+NOT_FOUND = problems.not_found("items.not_found", "Item not found")
+INVALID_NAME = problems.validation_error("items.invalid_name", detail="name must be 1..100 chars")
+
 
 @router.post("/items", status_code=201)
 def create_item(name: str):
     if not name or len(name) > 100:
-        raise ApiError(
-            422,
-            "Unprocessable Entity",
-            "name must be 1..100 chars",
-            extras={"error_code": "validation_error"},
-        )
-    db = get_db()
-    item = {"id": len(db["items"]) + 1, "name": name}
-    db["items"].append(item)
-    return item
+        raise ApiError.from_type(INVALID_NAME)
+    return FastJSONResponse(get_db()["items"].insert({"name": name}), status_code=201)
+
+
+@router.get("/items")
+def list_items(
+    request: Request,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    (after,) = decode_cursor(cursor, row_id) if cursor else (0,)
+    table = get_db()["items"]
+    tag = etag(table.version)
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    items = table.page(after, limit + 1)
+    headers = {ETAG_HEADER: tag}
+    if len(items) > limit:
+        items = items[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1]["id"])
+    return FastJSONResponse(items, headers=headers)
 
 
 @router.get("/items/{item_id}")
-def get_item(item_id: int):
-    db = get_db()
-    for it in db["items"]:
-        if it["id"] == item_id:
-            return it
-    raise ApiError(
-        404,
-        "Not Found",
-        "Item not found",
-        extras={"error_code": "not_found"},
-    )
+def get_item(request: Request, item_id: int = ITEM_ID):
+    table = get_db()["items"]
+    version = table.row_version(item_id)
+    if version is not None:
+        tag = etag(version)
+        cached = not_modified(request, tag)
+        if cached is not None:
+            return cached
+        item = table.get(item_id)
+        if item is not None:
+            return FastJSONResponse(item, headers={ETAG_HEADER: tag})
+    raise ApiError.from_type(NOT_FOUND)
@@ -1,23 +1,149 @@
-from fastapi import APIRouter, File, UploadFile
+from typing import AsyncIterator, Dict, List
+
+from fastapi import APIRouter, Request
+from python_multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
 
 from app import settings
 
-from ...common.upload import secure_save
+from ...common import problem as problems
+from ...common.upload import CHUNK_SIZE, MAX_REQUEST_BYTES, secure_save_stream
 from ...errors import ApiError
 
+_REJECTIONS = {
+    "too_big": problems.register("upload.too_big", 400, "Invalid upload", "File too large"),
+    "bad_type": problems.register(
+        "upload.bad_type", 400, "Invalid upload", "Unsupported file type"
+    ),
+    "path_traversal": problems.register(
+        "upload.path_traversal", 400, "Invalid upload", "Invalid path"
+    ),
+    "symlink_parent": problems.register(
+        "upload.symlink_parent", 400, "Invalid upload", "Invalid storage path"
+    ),
+}
+_BAD_REQUEST = problems.register("upload.bad_request", 400, "Bad Request", "Bad request")
+_FILE_REQUIRED = problems.validation_error(
+    "upload.file_required", loc="body.file", msg="Field required", type_="missing"
+)
+
+# поле формы с картинкой; схема тела — для OpenAPI, разбираем его сами
+FILE_FIELD = "file"
+_BODY_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [FILE_FIELD],
+                    "properties": {FILE_FIELD: {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 
-@router.post("/image")
-async def upload_image(file: UploadFile = File(...)) -> dict:  # noqa: B008
-    data = await file.read()
-    ok, res = secure_save(settings.get_upload_dir(), data)
+class _FilePart:
+    """
+    Колбэки MultipartParser: копят байты части `field`, пока их не заберёт
+    take(). Остальные части формы отбрасываются, не попадая в память.
+    """
+
+    def __init__(self, field: str) -> None:
+        self.field = field.encode()
+        self.found = False
+        self.done = False
+        self._current = False
+        self._header = b""
+        self._value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._pending: List[bytes] = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def take(self) -> List[bytes]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _part_begin(self) -> None:
+        self._headers = {}
+
+    def _header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _header_end(self) -> None:
+        self._headers[self._header.lower()] = self._value
+        self._header = self._value = b""
+
+    def _headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._current = not self.found and options.get(b"name") == self.field
+        self.found = self.found or self._current
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current:
+            self._pending.append(data[start:end])
+
+    def _part_end(self) -> None:
+        if self._current:
+            self._current = False
+            self.done = True
+
+
+async def _file_chunks(request: Request, field: str) -> AsyncIterator[bytes]:
+    """
+    Байты файла из multipart-тела по мере прихода, куски не больше CHUNK_SIZE:
+    тело не складывается ни в память, ни во временный файл, и ImageSink
+    отклоняет тип/размер, едва увидев первые/лишние байты. Дальше части
+    с файлом тело не читается; всё тело — не больше MAX_REQUEST_BYTES.
+    """
+    media_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if media_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise ApiError.from_type(_BAD_REQUEST)
+    part = _FilePart(field)
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    received = 0
+    try:
+        async for data in request.stream():
+            received += len(data)
+            if received > MAX_REQUEST_BYTES:
+                raise ApiError.from_type(_REJECTIONS["too_big"])
+            for offset in range(0, len(data), CHUNK_SIZE):
+                parser.write(data[offset : offset + CHUNK_SIZE])
+                for chunk in part.take():
+                    yield chunk
+                if part.done:
+                    return
+        parser.finalize()
+    except MultipartParseError:
+        raise ApiError.from_type(_BAD_REQUEST) from None
+    if not part.found:
+        raise ApiError.from_type(_FILE_REQUIRED)
+    if not part.done:  # тело оборвалось посреди файла
+        raise ApiError.from_type(_BAD_REQUEST)
+
+
+@router.post("/image", openapi_extra=_BODY_SCHEMA)
+async def upload_image(request: Request) -> dict:
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > MAX_REQUEST_BYTES:
+        raise ApiError.from_type(_REJECTIONS["too_big"])
+    ok, res = await secure_save_stream(settings.get_upload_dir(), _file_chunks(request, FILE_FIELD))
     if not ok:
-        title, status, detail = {
-            "too_big": ("Invalid upload", 400, "File too large"),
-            "bad_type": ("Invalid upload", 400, "Unsupported file type"),
-            "path_traversal": ("Invalid upload", 400, "Invalid path"),
-            "symlink_parent": ("Invalid upload", 400, "Invalid storage path"),
-        }.get(res, ("Bad Request", 400, "Bad request"))
-        raise ApiError(status, title, detail)
+        raise ApiError.from_type(_REJECTIONS.get(res, _BAD_REQUEST))
     return {"stored_as": res}
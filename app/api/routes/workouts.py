@@ -1,170 +1,341 @@
 from __future__ import annotations
 
 from datetime import date as _date
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Tuple, Type, TypeVar
 
-from fastapi import APIRouter, Body, Response
+from fastapi import APIRouter, Body, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 
-from app.db import get_db
-from app.errors import ApiError
+from app import settings
+from app.common import problem as problems
+from app.common.body_cache import BodyCache
+from app.common.conditional import ETAG_HEADER, PRECONDITION_FAILED, etag, if_match, not_modified
+from app.common.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, row_id
+from app.common.responses import FastJSONResponse, dumps
+from app.db import ROW_ID_LIMIT, DayTotal, VersionConflict, WorkoutStore, get_db
+from app.errors import ApiError, api_error_payload, validation_api_error
+from app.schemas.workouts import WorkoutIn, WorkoutOut, WorkoutStatsBucket, WorkoutUpdate
 
 BODY_REQUIRED = Body(...)
+# id вне [1, ROW_ID_LIMIT) строкой быть не может, а sqlite3 на int > 64 бит падает
+WORKOUT_ID = Path(..., ge=1, lt=ROW_ID_LIMIT)
+
+EXPORT_BATCH = 1000
+
+M = TypeVar("M", bound=BaseModel)
+
+# готовые тела GET /workouts по (параметры, версия таблицы); статистика — GET /metrics
+LIST_CACHE = BodyCache(settings.WORKOUTS_CACHE_MAX_ENTRIES, settings.WORKOUTS_CACHE_MAX_BYTES)
 
 router = APIRouter(prefix="/workouts", tags=["workouts"])
 
+# статические ошибки роутера: сериализуются один раз при импорте
+NOT_FOUND = problems.not_found("workouts.not_found", "Workout not found")
+BATCH_ID_REQUIRED = problems.validation_error(
+    "workouts.batch_id_required", loc="body.id", msg="integer id required", type_="int_type"
+)
+BATCH_OBJECT_REQUIRED = problems.validation_error(
+    "workouts.batch_object_required", loc="body", msg="object required", type_="dict_type"
+)
+INVALID_DATE_BOUND = problems.validation_error(
+    "workouts.invalid_date_bound",
+    loc="query",
+    msg="date_from/date_to must be YYYY-MM-DD",
+    type_="date_parsing",
+)
+
+
+def _table() -> WorkoutStore:
+    return get_db()["workouts"]
+
+
+def _iso(value: str) -> str:
+    return _date.fromisoformat(value).isoformat()
+
+
+def _date_bound(value: Optional[str]) -> Optional[str]:
+    """Граница диапазона из query: пусто — без границы, иначе строго ISO-дата."""
+    if not value:
+        return None
+    try:
+        return _iso(value)
+    except ValueError:
+        raise ApiError.from_type(INVALID_DATE_BOUND) from None
+
+
+def _row(payload: WorkoutIn) -> Dict[str, Any]:
+    """Строка хранилища: ровно поля схемы, дата — ISO-строка (на ней построен индекс)."""
+    return {
+        "title": payload.title,
+        "notes": payload.notes,
+        "duration_min": payload.duration_min,
+        "date": payload.date.isoformat(),
+    }
+
+
+def _changes(payload: WorkoutUpdate) -> Dict[str, Any]:
+    """Изменения PATCH: только заданные поля схемы, лишние ключи тела отброшены."""
+    changes = payload.model_dump(exclude_none=True)
+    if "date" in changes:
+        changes["date"] = changes["date"].isoformat()
+    return changes
 
-def _rows() -> List[Dict[str, Any]]:
-    db = get_db()
-    # приводим хранилище к списку
-    if "workouts" not in db or not isinstance(db["workouts"], list):
-        db["workouts"] = []
-    return db["workouts"]
 
+def _validate(model: Type[M], item: Any) -> M:
+    """Строка batch-запроса проверяется той же схемой, что и одиночный запрос."""
+    try:
+        return model.model_validate(item)
+    except ValidationError as e:
+        raise validation_api_error(e) from None
 
-def _next_id(rows: List[Dict[str, Any]]) -> int:
-    return max([w["id"] for w in rows], default=0) + 1
 
+def _not_found() -> ApiError:
+    return ApiError.from_type(NOT_FOUND)
 
-def _find(rows: List[Dict[str, Any]], wid: int) -> Optional[Dict[str, Any]]:
-    return next((w for w in rows if w.get("id") == wid), None)
 
+def _batch_id(item: Any) -> int:
+    wid = item.get("id") if isinstance(item, dict) else item
+    if isinstance(wid, bool) or not isinstance(wid, int):
+        raise ApiError.from_type(BATCH_ID_REQUIRED)
+    if not 0 < wid < ROW_ID_LIMIT:
+        raise _not_found()
+    return wid
 
-@router.post("", status_code=201)
-def create_workout(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:  # noqa: B008
-    rows = _rows()
 
-    title = payload.get("title")
-    if not title:
+def _batch_object(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        raise ApiError.from_type(BATCH_OBJECT_REQUIRED)
+    return item
+
+
+def _run_batch(
+    request: Request,
+    table: WorkoutStore,
+    items: List[Any],
+    op: Callable[[Any], Tuple[int, Optional[Dict[str, Any]]]],
+) -> FastJSONResponse:
+    """
+    Применяет op к каждой строке пачки независимо: ошибка строки не откатывает
+    остальные и возвращается как RFC 7807 problem в её результате.
+    Долговечность записей подтверждается разом на всю пачку (table.deferred()).
+    """
+    if len(items) > settings.BATCH_MAX_ITEMS:
         raise ApiError(
             422,
             "Unprocessable Entity",
-            "Request validation failed",
-            extras={
-                "error_code": "validation_error",
-                "errors": [{"loc": "body.title", "msg": "required", "type": "missing"}],
-            },
+            f"Batch is limited to {settings.BATCH_MAX_ITEMS} rows",
+            extras={"error_code": "validation_error"},
         )
+    cid = getattr(request.state, "correlation_id", None)
+    results: List[Dict[str, Any]] = []
+    with table.deferred():
+        for index, item in enumerate(items):
+            try:
+                status, data = op(item)
+            except ApiError as e:
+                results.append(
+                    {"index": index, "status": e.status, "problem": api_error_payload(e, cid)}
+                )
+                continue
+            result: Dict[str, Any] = {"index": index, "status": status}
+            if data is not None:
+                result["data"] = data
+            results.append(result)
+    return FastJSONResponse({"results": results})
+
+
+@router.post("", status_code=201, response_model=WorkoutOut)
+def create_workout(payload: WorkoutIn) -> Dict[str, Any]:
+    return _table().insert(_row(payload))
+
+
+@router.post(":batch")
+def create_workouts_batch(
+    request: Request,
+    items: List[Any] = BODY_REQUIRED,
+) -> FastJSONResponse:
+    table = _table()
+
+    def op(item: Any) -> Tuple[int, Optional[Dict[str, Any]]]:
+        return 201, table.insert(_row(_validate(WorkoutIn, _batch_object(item))))
+
+    return _run_batch(request, table, items, op)
+
+
+@router.patch(":batch")
+def patch_workouts_batch(
+    request: Request,
+    items: List[Any] = BODY_REQUIRED,
+) -> FastJSONResponse:
+    table = _table()
+
+    def op(item: Any) -> Tuple[int, Optional[Dict[str, Any]]]:
+        wid = _batch_id(_batch_object(item))
+        row = table.update(wid, _changes(_validate(WorkoutUpdate, item)))
+        if row is None:
+            raise _not_found()
+        return 200, row
+
+    return _run_batch(request, table, items, op)
 
-    duration_raw = payload.get("duration_min", None)
-    if duration_raw is None:
-        duration = 1
-    else:
-        try:
-            duration = int(duration_raw)
-        except (TypeError, ValueError):
-            duration = 0
-        if duration < 1:
-            raise ApiError(
-                422,
-                "Unprocessable Entity",
-                "Request validation failed",
-                extras={
-                    "error_code": "validation_error",
-                    "errors": [
-                        {
-                            "loc": "body.duration_min",
-                            "msg": ">= 1",
-                            "type": "greater_than_equal",
-                        }
-                    ],
-                },
-            )
-
-    wid = _next_id(rows)
-    w = {
-        "id": wid,
-        "title": title,
-        "notes": payload.get("notes"),
-        "duration_min": duration,
-        "date": payload.get("date") or _date.today().isoformat(),
-    }
-    rows.append(w)
-    return w
 
+@router.delete(":batch")
+def delete_workouts_batch(
+    request: Request,
+    ids: List[Any] = BODY_REQUIRED,
+) -> FastJSONResponse:
+    table = _table()
 
-@router.get("", status_code=200)
+    def op(item: Any) -> Tuple[int, Optional[Dict[str, Any]]]:
+        if not table.delete(_batch_id(item)):
+            raise _not_found()
+        return 204, None
+
+    return _run_batch(request, table, ids, op)
+
+
+@router.get("", status_code=200, response_model=List[WorkoutOut])
 def list_workouts(
+    request: Request,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-) -> List[Dict[str, Any]]:
-    rows = list(_rows())
-    if date_from or date_to:
-        lo = date_from or "0000-00-00"
-        hi = date_to or "9999-12-31"
-        rows = [w for w in rows if lo <= w["date"] <= hi]
-    rows.sort(key=lambda w: w["date"])
-    return rows
-
-
-@router.get("/{wid}")
-def get_workout(wid: int) -> Dict[str, Any]:
-    rows = _rows()
-    w = _find(rows, wid)
-    if not w:
-        raise ApiError(404, "Not Found", "Workout not found", extras={"error_code": "not_found"})
-    return w
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+) -> FastJSONResponse:
+    after = decode_cursor(cursor, _iso, row_id) if cursor else None
+    date_from, date_to = _date_bound(date_from), _date_bound(date_to)
+    table = _table()
+    # версия до чтения: запись между ними даст устаревший ETag, а не наоборот
+    tag = etag(table.version)
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    key = (date_from, date_to, after, limit)
+    hit = LIST_CACHE.get(key, tag)
+    if hit is not None:
+        body, headers = hit
+        return Response(body, media_type=FastJSONResponse.media_type, headers=headers)
+    # берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = table.range(date_from, date_to, after=after, limit=limit + 1)
+    headers = {ETAG_HEADER: tag}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["date"], rows[-1]["id"])
+    # строки уже в форме WorkoutOut (собраны из проверенных схем): отдаём сами,
+    # без повторной валидации response_model и jsonable_encoder
+    response = FastJSONResponse(rows, headers=headers)
+    # запись между чтением версии и range не страшна: тело под старой версией
+    # не будет выдано — версия таблицы уже другая
+    LIST_CACHE.put(key, tag, response.body, headers)
+    return response
 
 
-@router.patch("/{wid}")
-def patch_workout(
-    wid: int,
-    payload: Dict[str, Any] = BODY_REQUIRED,  # B008 не триггерится
-) -> Dict[str, Any]:
-    rows = _rows()
-    w = _find(rows, wid)
+def _iter_ndjson(date_from: Optional[str], date_to: Optional[str]) -> Iterator[bytes]:
+    """
+    Отдаём выгрузку пачками по EXPORT_BATCH строк, двигаясь keyset-курсором
+    по индексу дат: в памяти не больше одной пачки, конкурентные
+    create/delete не ломают итерацию.
+    """
+    table = _table()
+    after = None
+    while True:
+        rows = table.range(date_from, date_to, after=after, limit=EXPORT_BATCH)
+        if not rows:
+            return
+        yield b"".join(dumps(w) + b"\n" for w in rows)
+        after = (rows[-1]["date"], rows[-1]["id"])
+
+
+@router.get("/export")
+def export_workouts(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> StreamingResponse:
+    """Потоковая выгрузка всех тренировок в NDJSON (по строке JSON на тренировку)."""
+    return StreamingResponse(
+        _iter_ndjson(_date_bound(date_from), _date_bound(date_to)),
+        media_type="application/x-ndjson",
+    )
+
+
+def _period(day: str, group_by: str) -> str:
+    """Начало периода, в который попадает день: сам день, понедельник недели или 1-е число."""
+    if group_by == "day":
+        return day
+    if group_by == "month":
+        return day[:8] + "01"
+    d = _date.fromisoformat(day)
+    return _date.fromordinal(d.toordinal() - d.weekday()).isoformat()
+
+
+def _buckets(days: List[DayTotal], group_by: str) -> List[Dict[str, Any]]:
+    # итоги дней идут по возрастанию даты, поэтому периоды сливаются за один проход
+    out: List[Dict[str, Any]] = []
+    for day, count, total in days:
+        period = _period(day, group_by)
+        if out and out[-1]["period"] == period:
+            out[-1]["count"] += count
+            out[-1]["total_duration_min"] += total
+        else:
+            out.append({"period": period, "count": count, "total_duration_min": total})
+    return out
+
+
+@router.get("/stats", response_model=List[WorkoutStatsBucket])
+def workout_stats(
+    group_by: Literal["day", "week", "month"] = "day",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> FastJSONResponse:
+    """
+    Число тренировок и сумма duration_min по периодам.
+    Считается из итогов по дням, которые хранилище ведёт на каждой записи:
+    стоимость ~ число дней в диапазоне, а не число строк.
+    """
+    days = _table().day_totals(_date_bound(date_from), _date_bound(date_to))
+    return FastJSONResponse(_buckets(days, group_by))
+
+
+@router.get("/{wid}", response_model=WorkoutOut)
+def get_workout(request: Request, wid: int = WORKOUT_ID) -> Response:
+    table = _table()
+    version = table.row_version(wid)
+    if version is None:
+        raise _not_found()
+    tag = etag(version)
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    w = table.get(wid)
     if not w:
-        raise ApiError(404, "Not Found", "Workout not found", extras={"error_code": "not_found"})
+        raise _not_found()
+    return FastJSONResponse(w, headers={ETAG_HEADER: tag})
 
-    if "title" in payload and payload["title"] == "":
-        raise ApiError(
-            422,
-            "Unprocessable Entity",
-            "Title must not be empty",
-            extras={
-                "error_code": "validation_error",
-                "errors": [
-                    {
-                        "loc": "body.title",
-                        "msg": "min length 1",
-                        "type": "string_too_short",
-                    }
-                ],
-            },
-        )
 
-    if "duration_min" in payload:
-        try:
-            new_dur = int(payload["duration_min"])
-        except (TypeError, ValueError):
-            new_dur = 0
-        if new_dur < 1:
-            raise ApiError(
-                422,
-                "Unprocessable Entity",
-                "Request validation failed",
-                extras={
-                    "error_code": "validation_error",
-                    "errors": [
-                        {
-                            "loc": "body.duration_min",
-                            "msg": ">= 1",
-                            "type": "greater_than_equal",
-                        }
-                    ],
-                },
-            )
-
-    for k, v in payload.items():
-        if v is not None:
-            w[k] = v
-    return w
+@router.patch("/{wid}", response_model=WorkoutOut)
+def patch_workout(
+    payload: WorkoutUpdate, request: Request, response: Response, wid: int = WORKOUT_ID
+) -> Dict[str, Any]:
+    # проверка (строка есть, If-Match), запись и новая версия — одна операция хранилища
+    try:
+        versioned = _table().update_versioned(wid, _changes(payload), if_match=if_match(request))
+    except VersionConflict:
+        raise ApiError.from_type(PRECONDITION_FAILED) from None
+    if versioned is None:
+        raise _not_found()
+    row, version = versioned
+    # ETag новой версии: следующий If-Match — без лишнего GET
+    response.headers[ETAG_HEADER] = etag(version)
+    return row
 
 
 @router.delete("/{wid}", status_code=204, response_class=Response)
-def delete_workout(wid: int) -> Response:
-    rows = _rows()
-    w = _find(rows, wid)
-    if not w:
-        raise ApiError(404, "Not Found", "Workout not found", extras={"error_code": "not_found"})
-    rows.remove(w)
+def delete_workout(request: Request, wid: int = WORKOUT_ID) -> Response:
+    try:
+        deleted = _table().delete(wid, if_match=if_match(request))
+    except VersionConflict:
+        raise ApiError.from_type(PRECONDITION_FAILED) from None
+    if not deleted:
+        raise _not_found()
     return Response(status_code=204)
@@ -0,0 +1,82 @@
+"""
+Кеш готовых тел ответов на чтение хранилища (GET /workouts).
+Запись помечена версией таблицы, с которой снята; выдаётся только при той же
+версии. Любая запись в таблицу меняет версию — старые тела больше не выдаются
+и вытесняются при следующем обращении к ключу или по LRU.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+from typing import Dict, Hashable, Optional, Tuple
+
+Headers = Dict[str, str]
+
+
+@dataclass
+class _BodyEntry:
+    version: str
+    body: bytes
+    headers: Headers
+
+
+class BodyCache:
+    """
+    LRU с лимитами по числу записей и байтам тел; счётчики попаданий/промахов
+    для мониторинга. Sync-роуты идут из threadpool — операции под замком.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _BodyEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: str) -> Optional[Tuple[bytes, Headers]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.body, entry.headers
+            if entry is not None:
+                self._evict(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: str, body: bytes, headers: Headers) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = _BodyEntry(version, body, headers)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= len(old.body)
+
+    def _evict(self, key: Hashable) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
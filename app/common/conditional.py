@@ -0,0 +1,54 @@
+"""
+Условные запросы (RFC 9110) поверх версий хранилища.
+- ETag — строгий, из версии строки или таблицы: тело по URL однозначно ею задано;
+- If-None-Match на чтении -> 304 без чтения/сериализации тела (слабое сравнение);
+- If-Match на update/delete -> условие для хранилища, несовпадение -> 412
+  (строгое сравнение: W/-теги не совпадают ни с чем).
+"""
+
+from typing import FrozenSet, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.common import problem as problems
+
+ETAG_HEADER = "ETag"
+
+PRECONDITION_FAILED = problems.register(
+    "conditional.precondition_failed",
+    412,
+    "Precondition Failed",
+    "Resource was modified; fetch it again and retry with the new ETag",
+    code="precondition_failed",
+)
+
+
+def etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def _tags(header: str) -> List[str]:
+    return [t for t in (part.strip() for part in header.split(",")) if t]
+
+
+def not_modified(request: Request, tag: str) -> Optional[Response]:
+    """304 с тем же ETag, если он среди If-None-Match; иначе None — отдаём тело."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    tags = _tags(header)
+    if "*" in tags or tag in (t[2:] if t.startswith("W/") else t for t in tags):
+        return Response(status_code=304, headers={ETAG_HEADER: tag})
+    return None
+
+
+def if_match(request: Request) -> Optional[FrozenSet[str]]:
+    """Ожидаемые версии из If-Match для update/delete; None — без условия (нет заголовка, '*')."""
+    header = request.headers.get("if-match")
+    if header is None:
+        return None
+    tags = _tags(header)
+    if "*" in tags:
+        return None
+    return frozenset(t[1:-1] for t in tags if len(t) >= 2 and t[0] == t[-1] == '"')
@@ -1,6 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import email.utils
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
 from urllib.parse import urlsplit
 
 import httpx
@@ -8,6 +14,16 @@ import httpx
 from app import settings
 
 _ALLOWED_SCHEMES = {"http", "https"}
+_USER_AGENT = "course-project/secure-http-client"
+
+# ретраим сетевые сбои и явные «зайдите позже» от upstream
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ReadTimeout)
+_RETRYABLE_STATUSES = {429, 503}
+
+# общий на процесс клиент: keep-alive пул переиспользуется между вызовами
+_client: httpx.AsyncClient | None = None
+
+_sleep = asyncio.sleep
 
 
 def _validate_url(url: str) -> None:
@@ -25,39 +41,538 @@ def default_timeout() -> httpx.Timeout:
     return httpx.Timeout(connect=connect, read=read, write=read, pool=read)
 
 
-async def get_with_policies(url: str) -> httpx.Response:
+def default_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(getattr(settings, "HTTP_MAX_CONNECTIONS", 10)),
+        max_keepalive_connections=int(getattr(settings, "HTTP_MAX_KEEPALIVE", 5)),
+        keepalive_expiry=float(getattr(settings, "HTTP_KEEPALIVE_EXPIRY", 30.0)),
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Общий AsyncClient с политиками: без редиректов, с таймаутами и проверкой TLS.
+    Создаётся на старте приложения (lifespan) или лениво при первом вызове.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=default_timeout(),
+            limits=default_limits(),
+            headers={"User-Agent": _USER_AGENT},
+            follow_redirects=False,
+            verify=True,
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+Fetch = Callable[[Dict[str, str]], Awaitable[httpx.Response]]
+
+
+@dataclass
+class _CacheEntry:
+    response: httpx.Response
+    expires_at: float
+    size: int
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.response.headers.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.response.headers.get("last-modified")
+
+
+def _cache_control(headers: httpx.Headers) -> Dict[str, Optional[str]]:
+    out: Dict[str, Optional[str]] = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            out[name.lower()] = value.strip('"') or None
+    return out
+
+
+def _explicit_ttl(headers: httpx.Headers, cc: Dict[str, Optional[str]]) -> Optional[float]:
+    """Явный срок жизни: Cache-Control max-age, иначе Expires - Date."""
+    if cc.get("max-age") is not None:
+        try:
+            return max(float(cc["max-age"]), 0.0)
+        except ValueError:
+            return None
+    expires, date = headers.get("expires"), headers.get("date")
+    if expires and date:
+        try:
+            delta = email.utils.parsedate_to_datetime(expires) - email.utils.parsedate_to_datetime(
+                date
+            )
+        except (TypeError, ValueError):
+            return None
+        return max(delta.total_seconds(), 0.0)
+    return None
+
+
+def _freshness(headers: httpx.Headers) -> Optional[float]:
+    """
+    Сколько секунд ответ свежий; None — хранить нельзя.
+    0 — хранить только ради ревалидации (no-cache или одни валидаторы).
+    """
+    cc = _cache_control(headers)
+    if "no-store" in cc or headers.get("vary", "").strip() == "*":
+        return None
+    has_validators = "etag" in headers or "last-modified" in headers
+    ttl = None if "no-cache" in cc else _explicit_ttl(headers, cc)
+    if ttl is not None:
+        return ttl
+    return 0.0 if has_validators else None
+
+
+def _copy(response: httpx.Response) -> httpx.Response:
+    """Каждому вызывающему — своя копия ответа, кеш не делится изменяемым объектом."""
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        content=response.content,
+        request=response.request,
+    )
+
+
+class ResponseCache:
+    """
+    In-process кеш GET-ответов:
+    - свежесть по Cache-Control (max-age/no-cache/no-store) и Expires;
+    - ревалидация устаревших записей через If-None-Match / If-Modified-Since (304);
+    - LRU-вытеснение с лимитами по числу записей и по байтам тела;
+    - single-flight: конкурентные запросы одного URL ждут один поход в upstream.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 8_000_000,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, "asyncio.Task[httpx.Response]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    async def get(self, url: str, fetch: Fetch) -> httpx.Response:
+        entry = self._entries.get(url)
+        if entry is not None and entry.expires_at > self._clock():
+            self._entries.move_to_end(url)
+            return _copy(entry.response)
+
+        # поход в upstream — отдельная задача, не корутина первого вызвавшего:
+        # отмена любого из ждущих (и первого тоже) не обрывает её для остальных
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(url, entry, fetch))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._finish(url, t))
+        return _copy(await asyncio.shield(task))
+
+    def _finish(self, url: str, task: "asyncio.Task[httpx.Response]") -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            task.exception()  # ошибку заберут ожидающие; без них — не логируем как потерянную
+
+    async def _refresh(
+        self, url: str, entry: Optional[_CacheEntry], fetch: Fetch
+    ) -> httpx.Response:
+        headers: Dict[str, str] = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await fetch(headers)
+        if response.status_code == 304 and entry is not None:
+            # тело прежнее, обновляем заголовки свежести из 304
+            merged = httpx.Headers(entry.response.headers)
+            for name in ("cache-control", "expires", "date", "etag", "last-modified"):
+                if name in response.headers:
+                    merged[name] = response.headers[name]
+            response = httpx.Response(
+                entry.response.status_code,
+                headers=merged,
+                content=entry.response.content,
+                request=response.request,
+            )
+        self._store(url, response)
+        return response
+
+    def _store(self, url: str, response: httpx.Response) -> None:
+        self._evict(url)
+        if response.status_code != 200:
+            return
+        ttl = _freshness(response.headers)
+        if ttl is None:
+            return
+        size = len(response.content)
+        if size > self.max_bytes:
+            return
+        self._entries[url] = _CacheEntry(response, self._clock() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.size
+
+    def _evict(self, url: str) -> None:
+        old = self._entries.pop(url, None)
+        if old is not None:
+            self._bytes -= old.size
+
+
+_cache: ResponseCache | None = None
+
+
+def get_cache() -> ResponseCache:
+    """Общий на процесс кеш; лимиты — HTTP_CACHE_MAX_ENTRIES / HTTP_CACHE_MAX_BYTES."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(
+            max_entries=int(getattr(settings, "HTTP_CACHE_MAX_ENTRIES", 256)),
+            max_bytes=int(getattr(settings, "HTTP_CACHE_MAX_BYTES", 8_000_000)),
+        )
+    return _cache
+
+
+async def get_with_policies(
+    url: str,
+    *,
+    client: httpx.AsyncClient | None = None,
+    cache: ResponseCache | None = None,
+) -> httpx.Response:
     """
     Безопасные политики для исходящих HTTP:
     - Разрешены только http/https и только абсолютные URL.
     - Автоматические редиректы отключены.
     - Таймауты по умолчанию из settings.
     - Простой backoff-ретрай на сетевых/таймаут-ошибках.
+    - Соединения берутся из общего keep-alive пула (get_client()).
+    - Опционально — через ResponseCache (cache=get_cache()).
     """
     _validate_url(url)
+    client = client or get_client()
+    if cache is None:
+        return await _get_with_retries(client, url, {})
+    return await cache.get(url, lambda headers: _get_with_retries(client, url, headers))
+
+
+class CircuitOpenError(Exception):
+    """Upstream-хост помечен неисправным: запрос не отправляется (fail fast)."""
 
+    def __init__(self, host: str):
+        super().__init__(f"Circuit open for {host}")
+        self.host = host
+
+
+class TokenBucket:
+    """Бюджет ретраев: каждый повтор тратит токен, токены копятся со скоростью rate/сек."""
+
+    def __init__(self, burst: float, rate: float, *, clock: Callable[[], float] = time.monotonic):
+        self.burst = burst
+        self.rate = rate
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def try_acquire(self) -> bool:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    closed -> (threshold подряд неудач) -> open -> (reset_timeout) -> half-open.
+    В open запросы сразу отклоняются; в half-open пропускается ровно одна проба,
+    остальные отклоняются, пока она не завершится: успех закрывает цепь, неудача
+    снова открывает её на reset_timeout. Проба, не сообщившая исход (отмена,
+    чужое исключение), через reset_timeout уступает место следующей.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        reset_timeout: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing: Optional[float] = None  # когда выпущена текущая проба half-open
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half-open":
+            return state == "closed"
+        now = self._clock()
+        if self._probing is not None and now - self._probing < self.reset_timeout:
+            return False
+        self._probing = now
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = None
+
+    def record_failure(self) -> None:
+        self._probing = None
+        self._failures += 1
+        if self._opened_at is not None or self._failures >= self.threshold:
+            self._opened_at = self._clock()
+
+
+@dataclass
+class HostPolicy:
+    budget: TokenBucket
+    breaker: CircuitBreaker
+
+
+_host_policies: Dict[str, HostPolicy] = {}
+
+
+def host_policy(host: str) -> HostPolicy:
+    policy = _host_policies.get(host)
+    if policy is None:
+        policy = _host_policies[host] = HostPolicy(
+            budget=TokenBucket(
+                burst=float(getattr(settings, "HTTP_RETRY_BUDGET_BURST", 10)),
+                rate=float(getattr(settings, "HTTP_RETRY_BUDGET_RATE", 1.0)),
+            ),
+            breaker=CircuitBreaker(
+                threshold=int(getattr(settings, "HTTP_CB_FAILURE_THRESHOLD", 5)),
+                reset_timeout=float(getattr(settings, "HTTP_CB_RESET_TIMEOUT", 30.0)),
+            ),
+        )
+    return policy
+
+
+def reset_host_policies() -> None:
+    _host_policies.clear()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full jitter: случайная пауза в [0, min(cap, base * 2**attempt)] — ретраи не идут в ногу."""
+    base = float(getattr(settings, "HTTP_BACKOFF_BASE", 0.2))
+    cap = float(getattr(settings, "HTTP_BACKOFF_MAX", 2.0))
+    return random.uniform(0, min(cap, base * (2**attempt)))  # noqa: S311 - не криптография
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Retry-After в секундах (число или HTTP-date); None — заголовка нет или он битый."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+async def _get_with_retries(
+    client: httpx.AsyncClient, url: str, headers: Dict[str, str]
+) -> httpx.Response:
+    """
+    Ретраи с full-jitter backoff в пределах бюджета хоста; 429/503 повторяем
+    с учётом Retry-After (если ждать дольше HTTP_RETRY_AFTER_MAX — отдаём ответ как есть).
+    Сетевые ошибки и 5xx кормят circuit breaker хоста; пока он открыт — CircuitOpenError.
+    """
     retries = int(getattr(settings, "HTTP_MAX_RETRIES", 2))
-    backoff = float(getattr(settings, "HTTP_BACKOFF_BASE", 0.2))
-    last_err: Exception | None = None
+    retry_after_max = float(getattr(settings, "HTTP_RETRY_AFTER_MAX", 5.0))
+    host = urlsplit(url).netloc.lower()
+    policy = host_policy(host)
+
+    attempt = 0
+    while True:
+        if not policy.breaker.allow():
+            raise CircuitOpenError(host)
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.TransportError as e:
+            policy.breaker.record_failure()
+            if (
+                not isinstance(e, _RETRYABLE_ERRORS)
+                or attempt >= retries
+                or not policy.budget.try_acquire()
+            ):
+                raise
+            delay = _backoff_delay(attempt)
+        else:
+            if response.status_code >= 500:
+                policy.breaker.record_failure()
+            else:
+                policy.breaker.record_success()
+            if response.status_code not in _RETRYABLE_STATUSES or attempt >= retries:
+                return response
+            delay = _retry_after(response)
+            if delay is None:
+                delay = _backoff_delay(attempt)
+            if delay > retry_after_max or not policy.budget.try_acquire():
+                return response
+        attempt += 1
+        await _sleep(delay)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    response: Optional[httpx.Response] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def get_many(
+    urls: Iterable[str],
+    *,
+    concurrency: Optional[int] = None,
+    client: httpx.AsyncClient | None = None,
+    cache: ResponseCache | None = None,
+) -> AsyncIterator[FetchResult]:
+    """
+    Параллельный fan-out GET поверх get_with_policies: те же проверка URL,
+    ретраи, бюджет и circuit breaker на каждый URL, один общий пул соединений.
+    В полёте не больше `concurrency` запросов (по умолчанию HTTP_FANOUT_CONCURRENCY);
+    результаты отдаются по мере готовности, ошибки — в FetchResult.error.
+    Если потребитель прервал итерацию, оставшиеся запросы отменяются.
+    """
+    limit = (
+        concurrency
+        if concurrency is not None
+        else int(getattr(settings, "HTTP_FANOUT_CONCURRENCY", 10))
+    )
+    if limit < 1:
+        raise ValueError("concurrency must be >= 1")
+    sem = asyncio.Semaphore(limit)
+    client = client or get_client()
+
+    async def fetch_one(url: str) -> FetchResult:
+        async with sem:
+            try:
+                return FetchResult(
+                    url, response=await get_with_policies(url, client=client, cache=cache)
+                )
+            except Exception as e:
+                return FetchResult(url, error=e)
+
+    tasks = [asyncio.create_task(fetch_one(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ResponseTooLarge(Exception):
+    """Тело ответа upstream больше разрешённого лимита — передача прервана."""
 
-    limits = httpx.Limits(max_connections=10, max_keepalive_connections=5)
-    headers = {"User-Agent": "course-project/secure-http-client"}
+    def __init__(self, limit: int):
+        super().__init__(f"Response body exceeds {limit} bytes")
+        self.limit = limit
+
+
+async def stream_with_policies(
+    url: str,
+    *,
+    max_bytes: Optional[int] = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Потоковый GET с теми же политиками: тело отдаётся чанками, целиком в память
+    не читается. Лимит `max_bytes` (по умолчанию HTTP_STREAM_MAX_BYTES) проверяется
+    по Content-Length до чтения и по факту во время передачи -> ResponseTooLarge.
+    Не-2xx (включая редиректы) -> httpx.HTTPStatusError. Ретраи — только до
+    получения заголовков ответа (в пределах бюджета хоста).
+    """
+    _validate_url(url)
+    limit = max_bytes or int(getattr(settings, "HTTP_STREAM_MAX_BYTES", 10_000_000))
+    retries = int(getattr(settings, "HTTP_MAX_RETRIES", 2))
+    client = client or get_client()
+    host = urlsplit(url).netloc.lower()
+    policy = host_policy(host)
 
-    for attempt in range(retries + 1):
+    attempt = 0
+    while True:
+        if not policy.breaker.allow():
+            raise CircuitOpenError(host)
         try:
-            async with httpx.AsyncClient(
-                timeout=default_timeout(),
-                limits=limits,
-                headers=headers,
-                follow_redirects=False,
-                verify=True,
-            ) as client:
-                return await client.get(url)
-        except (httpx.ConnectError, httpx.ReadTimeout) as e:
-            last_err = e
-            if attempt == retries:
+            response = await client.send(client.build_request("GET", url), stream=True)
+            break
+        except httpx.TransportError as e:
+            policy.breaker.record_failure()
+            if (
+                not isinstance(e, _RETRYABLE_ERRORS)
+                or attempt >= retries
+                or not policy.budget.try_acquire()
+            ):
                 raise
-            await asyncio.sleep(backoff * (2**attempt))
+            await _sleep(_backoff_delay(attempt))
+            attempt += 1
 
-    if last_err is not None:
-        raise last_err
-    raise RuntimeError("Unexpected state in get_with_policies")
+    try:
+        if response.status_code >= 500:
+            policy.breaker.record_failure()
+        else:
+            policy.breaker.record_success()
+        response.raise_for_status()
+        declared = response.headers.get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            raise ResponseTooLarge(limit)
+        received = 0
+        # без chunk_size: чанки отдаются по мере прихода, без докапливания
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > limit:
+                raise ResponseTooLarge(limit)
+            yield chunk
+    finally:
+        await response.aclose()
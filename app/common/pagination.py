@@ -0,0 +1,44 @@
+"""Непрозрачные keyset-курсоры для постраничной выдачи."""
+
+import base64
+import binascii
+from typing import Any, Callable, Tuple
+
+from app.common import problem as problems
+from app.db import ROW_ID_LIMIT
+from app.errors import ApiError
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+INVALID_CURSOR = problems.validation_error(
+    "pagination.invalid_cursor",
+    loc="query.cursor",
+    msg="invalid cursor",
+    type_="value_error",
+    detail="Invalid cursor",
+)
+
+
+def encode_cursor(*parts: Any) -> str:
+    raw = "|".join(str(p) for p in parts).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[str], Any]) -> Tuple[Any, ...]:
+    """Разбирает курсор и приводит части к `types`; мусор -> 422 (RFC 7807)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        if len(parts) != len(types):
+            raise ValueError("cursor arity mismatch")
+        return tuple(t(p) for t, p in zip(types, parts, strict=True))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ApiError.from_type(INVALID_CURSOR) from None
+
+
+def row_id(value: str) -> int:
+    """id строки из курсора; вне [0, ROW_ID_LIMIT) — ValueError (-> INVALID_CURSOR)."""
+    n = int(value)
+    if not 0 <= n < ROW_ID_LIMIT:
+        raise ValueError("cursor id out of range")
+    return n
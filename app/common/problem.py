@@ -1,25 +1,141 @@
-from typing import Any, Dict, Optional
-from uuid import uuid4
+"""
+RFC 7807 problem+json: единственная реализация problem() и реестр
+заранее сериализованных типов ошибок.
+"""
 
-from starlette.responses import JSONResponse
+from typing import Any, Dict, List, Optional
 
+from starlette.responses import Response
 
-def problem(
+from app.common.responses import FastJSONResponse, dumps
+
+PROBLEM_MEDIA_TYPE = "application/problem+json"
+
+
+def problem_payload(
+    *,
     status: int,
     title: str,
     detail: str,
-    *,
     type_: str = "about:blank",
     extras: Optional[Dict[str, Any]] = None,
     correlation_id: Optional[str] = None,
-) -> JSONResponse:
+) -> Dict[str, Any]:
+    """Тело RFC 7807 problem (dict) — для ответа целиком или для строки batch-запроса."""
     payload: Dict[str, Any] = {
         "type": type_,
         "title": title,
         "status": status,
         "detail": detail,
-        "correlation_id": correlation_id or str(uuid4()),
+        "correlation_id": correlation_id,
     }
     if extras:
         payload.update(extras)
-    return JSONResponse(payload, status_code=status)
+    return payload
+
+
+def problem(
+    *,
+    status: int,
+    title: str,
+    detail: str,
+    type_: str = "about:blank",
+    extras: Optional[Dict[str, Any]] = None,
+    correlation_id: Optional[str] = None,
+) -> FastJSONResponse:
+    """RFC 7807 problem+json payload + корректный media type."""
+    payload = problem_payload(
+        status=status,
+        title=title,
+        detail=detail,
+        type_=type_,
+        extras=extras,
+        correlation_id=correlation_id,
+    )
+    return FastJSONResponse(payload, status_code=status, media_type=PROBLEM_MEDIA_TYPE)
+
+
+class ProblemType:
+    """
+    Статическая ошибка (404, типовые 422, ...): всё, кроме correlation_id,
+    сериализуется один раз при создании. На ответ к готовым байтам
+    дописывается только id — без сборки dict и json.dumps на каждый запрос.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        status: int,
+        title: str,
+        detail: str,
+        *,
+        type_: str = "about:blank",
+        code: Optional[str] = None,
+        errors: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.name = name
+        self.status = status
+        self.title = title
+        self.detail = detail
+        self.type_ = type_
+        self.code = code
+        extras: Dict[str, Any] = {}
+        if errors:
+            extras["errors"] = errors
+        if code is not None:
+            extras["error_code"] = code
+        self.extras = extras
+        static = problem_payload(
+            status=status, title=title, detail=detail, type_=type_, extras=extras
+        )
+        del static["correlation_id"]
+        self._static = static
+        # тот же формат, что у FastJSONResponse: компактные разделители, UTF-8
+        self._head = dumps(static)[:-1] + b',"correlation_id":'
+
+    def payload(self, correlation_id: Optional[str] = None) -> Dict[str, Any]:
+        return {**self._static, "correlation_id": correlation_id}
+
+    def render(self, correlation_id: Optional[str] = None) -> bytes:
+        return self._head + dumps(correlation_id) + b"}"
+
+    def response(self, correlation_id: Optional[str] = None) -> Response:
+        return Response(
+            content=self.render(correlation_id),
+            status_code=self.status,
+            media_type=PROBLEM_MEDIA_TYPE,
+        )
+
+
+PROBLEM_TYPES: Dict[str, ProblemType] = {}
+
+
+def register(name: str, status: int, title: str, detail: str, **kwargs: Any) -> ProblemType:
+    """Создаёт и регистрирует тип ошибки; имя уникально в пределах процесса."""
+    if name in PROBLEM_TYPES:
+        raise ValueError(f"Problem type {name!r} is already registered")
+    ptype = PROBLEM_TYPES[name] = ProblemType(name, status, title, detail, **kwargs)
+    return ptype
+
+
+def not_found(name: str, detail: str) -> ProblemType:
+    return register(name, 404, "Not Found", detail, code="not_found")
+
+
+def validation_error(
+    name: str,
+    *,
+    loc: Optional[str] = None,
+    msg: Optional[str] = None,
+    type_: Optional[str] = None,
+    detail: str = "Request validation failed",
+) -> ProblemType:
+    errors = [{"loc": loc, "msg": msg, "type": type_}] if loc is not None else None
+    return register(
+        name,
+        422,
+        "Unprocessable Entity",
+        detail,
+        code="validation_error",
+        errors=errors,
+    )
@@ -0,0 +1,50 @@
+"""
+Быстрая сериализация JSON-ответов.
+orjson, если установлен; иначе stdlib json с теми же правилами
+(компактные разделители, UTF-8, даты в ISO).
+"""
+
+import datetime as dt
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:  # pragma: no cover - зависит от окружения
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (dt.date, dt.datetime)):
+        return obj.isoformat()
+    model_dump = getattr(obj, "model_dump", None)
+    if model_dump is not None:
+        return model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+dumps = _orjson_dumps if orjson is not None else _stdlib_dumps
+# парный декодер — для своих же файлов (WAL, снапшоты)
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse на dumps(): ответ приложения по умолчанию.
+    Роуты, которые возвращают его сами, минуют и jsonable_encoder FastAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
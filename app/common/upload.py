@@ -1,14 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
 import os
 from pathlib import Path
+import threading
+from typing import AsyncIterable, Callable, Iterable, Optional, TypeVar
 import uuid
 
+from app import settings
+from app.common.http_client import ResponseTooLarge, stream_with_policies
+
 ALLOWED = {"image/png", "image/jpeg"}
 MAX_BYTES = 5_000_000
+# потолок всего multipart-тела: файл + конверт (boundary, заголовки части)
+MAX_REQUEST_BYTES = MAX_BYTES + 64 * 1024
+CHUNK_SIZE = 64 * 1024
 
 PNG = b"\x89PNG\r\n\x1a\n"
 JPEG_SOI = b"\xff\xd8"
 JPEG_EOI = b"\xff\xd9"
 
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _io_executor() -> ThreadPoolExecutor:
+    """
+    Отдельный пул под файловый I/O загрузок (mkdir/open/write/fsync):
+    медленный fsync не блокирует event loop и не занимает общий threadpool
+    FastAPI, в котором крутятся sync-роуты.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.UPLOAD_IO_WORKERS, thread_name_prefix="upload-io"
+                )
+    return _executor
+
+
+def shutdown_io_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _run_io(fn: Callable[..., T], *args) -> "asyncio.Future[T]":
+    return asyncio.get_running_loop().run_in_executor(_io_executor(), fn, *args)
+
 
 def sniff_image_type(data: bytes) -> str | None:
     if data.startswith(PNG):
@@ -18,38 +62,164 @@ def sniff_image_type(data: bytes) -> str | None:
     return None
 
 
+def _sniff_head(head: bytes) -> str | None:
+    """Тип по первым байтам; EOI у JPEG проверяется в конце потока."""
+    if head.startswith(PNG):
+        return "image/png"
+    if head.startswith(JPEG_SOI):
+        return "image/jpeg"
+    return None
+
+
+class UploadRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ImageSink:
+    """
+    Потоковая запись загрузки: тип определяется по первым байтам, размер
+    считается на лету, данные пишутся сразу в fd, открытый с O_EXCL|O_NOFOLLOW.
+    В памяти держим только текущий чанк. При отказе недописанный файл удаляется.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.size = 0
+        self.media_type: str | None = None
+        self._head = b""
+        self._tail = b""
+        self._file = None
+        self._path: Path | None = None
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > MAX_BYTES:
+            raise UploadRejected("too_big")
+        if self._file is None:
+            self._head += chunk
+            if len(self._head) < len(PNG):
+                return
+            chunk, self._head = self._head, b""
+            self._open(chunk)
+        self._file.write(chunk)
+        self._tail = (self._tail + chunk)[-len(JPEG_EOI) :]
+
+    def finish(self) -> str:
+        if self._file is None:
+            # поток короче сигнатуры PNG — это может быть только крошечный JPEG
+            head, self._head = self._head, b""
+            if sniff_image_type(head) is None:
+                raise UploadRejected("bad_type")
+            self._open(head)
+            self._file.write(head)
+            self._tail = head[-len(JPEG_EOI) :]
+        if self.media_type == "image/jpeg" and self._tail != JPEG_EOI:
+            raise UploadRejected("bad_type")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        return str(self._path)
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def _open(self, head: bytes) -> None:
+        mt = _sniff_head(head)
+        if mt not in ALLOWED:
+            raise UploadRejected("bad_type")
+        self.media_type = mt
+
+        root = Path(self.base_dir).resolve()
+        root.mkdir(parents=True, exist_ok=True)
+        if root.is_symlink():
+            raise UploadRejected("symlink_root")
+
+        ext = ".png" if mt == "image/png" else ".jpg"
+        name = f"{uuid.uuid4()}{ext}"
+
+        dir_fd = os.open(str(root), os.O_RDONLY)
+        try:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+            if hasattr(os, "O_NOFOLLOW"):
+                flags |= os.O_NOFOLLOW
+            fd = os.open(name, flags, mode=0o600, dir_fd=dir_fd)
+        finally:
+            try:
+                os.close(dir_fd)
+            except OSError:
+                pass
+        self._file = os.fdopen(fd, "wb")
+        self._path = root / name
+
+
 def secure_save(base_dir: str, data: bytes) -> tuple[bool, str]:
-    if len(data) > MAX_BYTES:
-        return False, "too_big"
+    return secure_save_chunks(base_dir, [data])
 
-    mt = sniff_image_type(data)
-    if mt not in ALLOWED:
-        return False, "bad_type"
 
-    root = Path(base_dir).resolve()
-    root.mkdir(parents=True, exist_ok=True)
-    if root.is_symlink():
-        return False, "symlink_root"
+def secure_save_chunks(base_dir: str, chunks: Iterable[bytes]) -> tuple[bool, str]:
+    sink = ImageSink(base_dir)
+    try:
+        for chunk in chunks:
+            sink.write(chunk)
+        return True, sink.finish()
+    except UploadRejected as e:
+        sink.abort()
+        return False, e.reason
+    except BaseException:
+        sink.abort()
+        raise
 
-    ext = ".png" if mt == "image/png" else ".jpg"
-    name = f"{uuid.uuid4()}{ext}"
 
-    stored_path_str: str
-    dir_fd = os.open(str(root), os.O_RDONLY)
+async def secure_save_stream(base_dir: str, chunks: AsyncIterable[bytes]) -> tuple[bool, str]:
+    """
+    Как secure_save, но по потоку чанков: отказ — сразу, как только он ясен.
+    Вся блокирующая работа с диском уходит в _io_executor().
+    """
+    sink = ImageSink(base_dir)
+    job: Optional["asyncio.Future[object]"] = None
     try:
-        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
-        if hasattr(os, "O_NOFOLLOW"):
-            flags |= os.O_NOFOLLOW
-        fd = os.open(name, flags, mode=0o600, dir_fd=dir_fd)
-        with os.fdopen(fd, "wb") as f:
-            f.write(data)
-            f.flush()
-            os.fsync(f.fileno())
-        stored_path_str = str(root / name)
-    finally:
-        try:
-            os.close(dir_fd)
-        except OSError:
-            pass
+        async for chunk in chunks:
+            job = _run_io(sink.write, chunk)
+            await asyncio.shield(job)
+        job = _run_io(sink.finish)
+        return True, await asyncio.shield(job)
+    except UploadRejected as e:
+        await _run_io(sink.abort)
+        return False, e.reason
+    except BaseException:
+        # отмена не останавливает поток пула: abort — после текущей операции и тем же пулом
+        await asyncio.shield(_abort_after(sink, job))
+        raise
+
 
-    return True, stored_path_str
+async def _abort_after(sink: ImageSink, job: Optional["asyncio.Future[object]"]) -> None:
+    if job is not None:
+        await asyncio.wait([job])
+    await _run_io(sink.abort)
+
+
+async def import_image_from_url(base_dir: str, url: str) -> tuple[bool, str]:
+    """
+    Импорт картинки по URL: тело upstream идёт потоком прямо в ImageSink,
+    передача обрывается на MAX_BYTES. Сетевые/HTTP-ошибки пробрасываются.
+    Вызывающий отвечает за то, какие URL сюда попадают (SSRF): здесь
+    проверяются только схема и абсолютность.
+    """
+    try:
+        async with aclosing(stream_with_policies(url, max_bytes=MAX_BYTES)) as chunks:
+            return await secure_save_stream(base_dir, chunks)
+    except ResponseTooLarge:
+        return False, "too_big"
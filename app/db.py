@@ -1,5 +1,545 @@
-_DB: dict[str, list[dict]] = {"items": [], "workouts": []}
+from __future__ import annotations
 
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import date as _date
+from functools import lru_cache
+import secrets
+import sys
+import threading
+from typing import Any, Container, ContextManager, Dict, Iterator, List, Optional, Protocol, Tuple
 
-def get_db() -> dict[str, list[dict]]:
+from app import settings
+
+Row = Dict[str, Any]
+DateKey = Tuple[str, int]
+# итог дня: (ISO-дата, число тренировок, сумма duration_min)
+DayTotal = Tuple[str, int, int]
+
+
+class VersionConflict(Exception):
+    """Условная запись (If-Match): текущая версия строки не из ожидаемых."""
+
+
+def check_version(current: str, if_match: Optional[Container[str]]) -> None:
+    if if_match is not None and current not in if_match:
+        raise VersionConflict(current)
+
+
+class RowStore(Protocol):
+    """
+    Контракт хранилища таблицы; его реализуют все бэкенды (memory, sqlite, log, WAL).
+    Версии — непрозрачные строки: version меняется на каждой записи в таблицу,
+    row_version — на каждой записи в строку. update/delete с if_match пишут,
+    только если текущая версия строки среди ожидаемых, иначе VersionConflict.
+    """
+
+    @property
+    def version(self) -> str: ...
+
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[Row]: ...
+
+    def insert(self, row: Row) -> Row: ...
+
+    def get(self, row_id: int) -> Optional[Row]: ...
+
+    def row_version(self, row_id: int) -> Optional[str]: ...
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]: ...
+
+    def update_versioned(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Tuple[Row, str]]:
+        """update и версия строки после него — одной операцией (ETag ответа PATCH)."""
+        ...
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool: ...
+
+    def clear(self) -> None: ...
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]: ...
+
+    def deferred(self) -> ContextManager[None]:
+        """
+        Пачка записей одного потока (batch-роуты): бэкенд вправе подтвердить
+        их долговечность разом на выходе из блока, а не каждую отдельно.
+        """
+        ...
+
+
+class WorkoutStore(RowStore, Protocol):
+    def range(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        after: Optional[DateKey] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]: ...
+
+    def day_totals(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> List[DayTotal]: ...
+
+
+class Table:
+    """
+    In-memory таблица с хеш-индексом id -> строка.
+    - get/update/delete за O(1), без линейных проходов по списку;
+    - id выдаются монотонной последовательностью (не переиспользуются после delete);
+    - порядок итерации = порядок вставки (= порядок id).
+    Sync-роуты идут из threadpool параллельно, поэтому каждая операция держит
+    замок таблицы: выдача id и запись строки атомарны, чтение не видит
+    полузаписанное состояние. Замок — RLock на таблицу, а не RW-lock: под GIL
+    читатели всё равно не выполняются параллельно, а RLock дешевле на захват.
+    Версии: счётчик записей в таблицу; версия строки — значение счётчика на её
+    последней записи. epoch (случайный, если не задан) отличает версии таблиц,
+    начатых заново, — после рестарта старый ETag не совпадёт с новым.
+    """
+
+    def __init__(self, epoch: Optional[str] = None) -> None:
+        self._rows: Dict[int, Row] = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._epoch = epoch or secrets.token_hex(4)
+        self._version = 0
+        self._stamps: Dict[int, int] = {}
+
+    def _token(self, stamp: int) -> str:
+        return f"{self._epoch}.{stamp}"
+
+    def _bump(self) -> int:
+        self._version += 1
+        return self._version
+
+    @property
+    def version(self) -> str:
+        return self._token(self._version)
+
+    def row_version(self, row_id: int) -> Optional[str]:
+        stamp = self._stamps.get(row_id)
+        return None if stamp is None else self._token(stamp)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Row]:
+        with self._lock:
+            return iter(list(self._rows.values()))
+
+    def __contains__(self, row_id: object) -> bool:
+        return row_id in self._rows
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def insert(self, row: Row) -> Row:
+        """Присваивает id из последовательности и сохраняет строку."""
+        with self._lock:
+            row = {"id": self.next_id(), **row}
+            self._rows[row["id"]] = row
+            self._stamps[row["id"]] = self._bump()
+            return row
+
+    def get(self, row_id: int) -> Optional[Row]:
+        return self._rows.get(row_id)
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]:
+        with self._lock:
+            row = self._rows.get(row_id)
+            if row is None:
+                return None
+            check_version(self._token(self._stamps[row_id]), if_match)
+            row.update(changes)
+            self._stamps[row_id] = self._bump()
+            return row
+
+    def update_versioned(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Tuple[Row, str]]:
+        with self._lock:
+            row = self.update(row_id, changes, if_match=if_match)
+            return None if row is None else (row, self.row_version(row_id))
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool:
+        with self._lock:
+            if row_id not in self._rows:
+                return False
+            check_version(self._token(self._stamps[row_id]), if_match)
+            del self._rows[row_id]
+            del self._stamps[row_id]
+            self._bump()
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows.clear()
+            self._stamps.clear()
+            self._seq = 0
+            self._bump()
+
+    def dump(self) -> Dict[str, Any]:
+        """Согласованный срез для снапшота; формат — только для restore той же таблицы."""
+        with self._lock:
+            return {
+                "seq": self._seq,
+                "version": self._version,
+                "rows": [dict(row) for row in self._rows.values()],
+                "stamps": list(self._stamps.items()),
+            }
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[None]:
+        """Массовое воспроизведение записей (WAL при старте); у Table индексов нет."""
+        yield
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """Пачка записей (RowStore.deferred): журнала нет — подтверждать нечего."""
+        yield
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Загрузка снапшота целиком — без построчных insert."""
+        with self._lock:
+            self._rows = {row["id"]: row for row in state["rows"]}
+            self._stamps = dict(state["stamps"])
+            self._seq = state["seq"]
+            self._version = state["version"]
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]:
+        """
+        Keyset-страница: строки с id > after в порядке id.
+        id монотонны, поэтому ищем по последовательности, а не сканируем таблицу:
+        стоимость ~ limit + число удалённых id в пропущенном окне.
+        """
+        out: List[Row] = []
+        rows = self._rows
+        with self._lock:
+            for row_id in range(max(after, 0) + 1, self._seq + 1):
+                row = rows.get(row_id)
+                if row is not None:
+                    out.append(row)
+                    if limit is not None and len(out) >= limit:
+                        break
+        return out
+
+
+# ключ индекса дат: (ординал дня << _ID_BITS) | id — одно int вместо кортежа (str, int)
+_ID_BITS = 40
+_ID_MASK = (1 << _ID_BITS) - 1
+# id строк лежат в [0, ROW_ID_LIMIT): больший id не помещается в ключ индекса дат
+ROW_ID_LIMIT = 1 << _ID_BITS
+
+
+@lru_cache(maxsize=None)
+def _iso_day(day: int) -> str:
+    """ISO-строка дня; кэш — одна общая строка на дату, а не на строку таблицы."""
+    return _date.fromordinal(day).isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _day(value: str) -> int:
+    """Ординал дня по ISO-строке; кэш — дат в данных немного, а строк — миллионы."""
+    return _date.fromisoformat(value).toordinal()
+
+
+class _Workout:
+    """
+    Компактная запись тренировки: слоты вместо dict, дата — ординал дня,
+    title интернирован (повторяющиеся названия — один объект str).
+    dict собирается только на выдаче (as_row). version — отметка последней записи.
+    """
+
+    __slots__ = ("id", "title", "notes", "duration_min", "day", "version")
+
+    def __init__(
+        self,
+        row_id: int,
+        title: str,
+        notes: Optional[str],
+        duration_min: Optional[int],
+        day: int,
+        version: int,
+    ) -> None:
+        self.id = row_id
+        self.title = sys.intern(title)
+        self.notes = notes
+        self.duration_min = duration_min
+        self.day = day
+        self.version = version
+
+    @classmethod
+    def from_row(cls, row_id: int, row: Row, version: int) -> _Workout:
+        return cls(
+            row_id,
+            row["title"],
+            row.get("notes"),
+            row.get("duration_min"),
+            _day(row["date"]),
+            version,
+        )
+
+    def fields(self) -> Tuple[int, str, Optional[str], Optional[int], int, int]:
+        return self.id, self.title, self.notes, self.duration_min, self.day, self.version
+
+    def as_row(self) -> Row:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "notes": self.notes,
+            "duration_min": self.duration_min,
+            "date": _iso_day(self.day),
+        }
+
+    def key(self) -> int:
+        return (self.day << _ID_BITS) | self.id
+
+
+class WorkoutTable(Table):
+    """
+    Таблица тренировок со вторичным индексом по дате.
+    Строки хранятся компактными записями _Workout; наружу (get/range/page/iter)
+    отдаются новые dict-ы, так что изменить запись в обход update нельзя.
+    Индекс — отсортированный список int-ключей (день, id): диапазон дат
+    режется bisect-ом за O(log n + k) без пересортировки всей таблицы.
+    Итоги по дням (число, сумма минут) ведутся инкрементально на каждой записи.
+    """
+
+    def __init__(self, epoch: Optional[str] = None) -> None:
+        super().__init__(epoch)
+        self._by_date: List[int] = []
+        self._bulk = False
+        self._totals: Dict[int, List[int]] = {}
+        self._days: List[int] = []
+
+    def __iter__(self) -> Iterator[Row]:
+        with self._lock:
+            return iter([w.as_row() for w in self._rows.values()])
+
+    def row_version(self, row_id: int) -> Optional[str]:
+        w = self._rows.get(row_id)
+        return None if w is None else self._token(w.version)
+
+    def insert(self, row: Row) -> Row:
+        with self._lock:
+            w = _Workout.from_row(self.next_id(), row, self._bump())
+            self._rows[w.id] = w
+            self._index(w)
+            self._roll(w, 1)
+            return w.as_row()
+
+    def get(self, row_id: int) -> Optional[Row]:
+        with self._lock:
+            w = self._rows.get(row_id)
+            return None if w is None else w.as_row()
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]:
+        day = _day(changes["date"]) if "date" in changes else None
+        with self._lock:
+            w = self._rows.get(row_id)
+            if w is None:
+                return None
+            check_version(self._token(w.version), if_match)
+            w.version = self._bump()
+            rerolled = day is not None or "duration_min" in changes
+            if rerolled:
+                self._roll(w, -1)
+            if "title" in changes:
+                w.title = sys.intern(changes["title"])
+            if "notes" in changes:
+                w.notes = changes["notes"]
+            if "duration_min" in changes:
+                w.duration_min = changes["duration_min"]
+            if day is not None and day != w.day:
+                self._unindex(w)
+                w.day = day
+                self._index(w)
+            if rerolled:
+                self._roll(w, 1)
+            return w.as_row()
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool:
+        with self._lock:
+            w = self._rows.get(row_id)
+            if w is None:
+                return False
+            check_version(self._token(w.version), if_match)
+            del self._rows[row_id]
+            self._bump()
+            self._unindex(w)
+            self._roll(w, -1)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._by_date.clear()
+            self._totals.clear()
+            self._days.clear()
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]:
+        with self._lock:
+            return [w.as_row() for w in super().page(after, limit)]
+
+    def dump(self) -> Dict[str, Any]:
+        """Строки снапшота — кортежи полей записи с ординалом дня: ни dict, ни разбора дат."""
+        with self._lock:
+            return {
+                "seq": self._seq,
+                "version": self._version,
+                "rows": [w.fields() for w in self._rows.values()],
+            }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        # индекс строится одной сортировкой, а не insort на каждую строку
+        records = [_Workout(*fields) for fields in state["rows"]]
+        totals: Dict[int, List[int]] = {}
+        for w in records:
+            total = totals.get(w.day)
+            if total is None:
+                total = totals[w.day] = [0, 0]
+            total[0] += 1
+            total[1] += w.duration_min or 0
+        with self._lock:
+            self._rows = {w.id: w for w in records}
+            self._seq = state["seq"]
+            self._version = state["version"]
+            self._by_date = sorted(w.key() for w in records)
+            self._totals = totals
+            self._days = sorted(totals)
+
+    def _roll(self, w: _Workout, sign: int) -> None:
+        """Добавляет (sign=1) или вычитает (sign=-1) запись из итогов её дня."""
+        total = self._totals.get(w.day)
+        if total is None:
+            total = self._totals[w.day] = [0, 0]
+            insort(self._days, w.day)
+        total[0] += sign
+        total[1] += sign * (w.duration_min or 0)
+        if total[0] == 0:
+            del self._totals[w.day]
+            del self._days[bisect_left(self._days, w.day)]
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[None]:
+        """
+        Индекс дат не ведётся построчно (insort в середину списка на миллионе
+        строк — O(n) на вставку), а строится одной сортировкой в конце.
+        """
+        with self._lock:
+            self._bulk = True
+            try:
+                yield
+            finally:
+                self._bulk = False
+                self._by_date = sorted(w.key() for w in self._rows.values())
+
+    def _index(self, w: _Workout) -> None:
+        if not self._bulk:
+            insort(self._by_date, w.key())
+
+    def _unindex(self, w: _Workout) -> None:
+        if self._bulk:
+            return
+        key = w.key()
+        i = bisect_left(self._by_date, key)
+        if i < len(self._by_date) and self._by_date[i] == key:
+            del self._by_date[i]
+
+    def range(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        after: Optional[DateKey] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]:
+        """
+        Строки с date_from <= date <= date_to (границы включительно, ISO), по (date, id).
+        after — keyset-курсор (date, id) последней отданной строки: страница
+        начинается строго после него, глубина страницы на стоимость не влияет.
+        """
+        lo_key = None if date_from is None else _day(date_from) << _ID_BITS
+        after_key = None if after is None else (_day(after[0]) << _ID_BITS) | after[1]
+        hi_key = None if date_to is None else (_day(date_to) + 1) << _ID_BITS
+        with self._lock:
+            keys = self._by_date
+            lo = 0 if lo_key is None else bisect_left(keys, lo_key)
+            if after_key is not None:
+                lo = max(lo, bisect_right(keys, after_key))
+            hi = len(keys) if hi_key is None else bisect_left(keys, hi_key)
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            rows = self._rows
+            return [rows[key & _ID_MASK].as_row() for key in keys[lo:hi]]
+
+    def day_totals(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> List[DayTotal]:
+        """Итоги по дням в [date_from, date_to] за O(log d + k), без прохода по строкам."""
+        day_from = None if date_from is None else _day(date_from)
+        day_to = None if date_to is None else _day(date_to)
+        with self._lock:
+            days = self._days
+            lo = 0 if day_from is None else bisect_left(days, day_from)
+            hi = len(days) if day_to is None else bisect_right(days, day_to)
+            totals = self._totals
+            return [(_iso_day(d), *totals[d]) for d in days[lo:hi]]
+
+
+_DB: Optional[dict[str, Any]] = None
+_DB_LOCK = threading.Lock()
+
+
+def _build_db() -> dict[str, Any]:
+    backend = settings.get_storage_backend()
+    if backend == "memory":
+        wal_dir = settings.get_wal_dir()
+        if wal_dir:
+            from app.storage.wal import open_wal_db
+
+            return open_wal_db(wal_dir, settings.WAL_SNAPSHOT_EVERY)
+        return {"items": Table(), "workouts": WorkoutTable()}
+    if backend == "sqlite":
+        from app.storage.sqlite import open_sqlite_db
+
+        return open_sqlite_db(settings.get_sqlite_path(), settings.SQLITE_POOL_SIZE)
+    if backend == "log":
+        from app.storage.log import open_log_db
+
+        return open_log_db(settings.get_log_path(), settings.LOG_COMPACT_MIN_BYTES)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+
+
+def get_db() -> dict[str, Any]:
+    """Таблицы выбранного в settings бэкенда; создаются при первом обращении."""
+    global _DB
+    if _DB is None:
+        with _DB_LOCK:
+            if _DB is None:
+                _DB = _build_db()
     return _DB
+
+
+def close_db() -> None:
+    """
+    Закрывает внешние ресурсы бэкенда (пул соединений sqlite) на остановке
+    приложения; следующий get_db() откроет его заново. In-memory таблицы живут.
+    """
+    global _DB
+    with _DB_LOCK:
+        closable = [t for t in (_DB or {}).values() if hasattr(t, "close")]
+        for table in closable:
+            table.close()
+        if closable:
+            _DB = None
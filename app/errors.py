@@ -1,33 +1,26 @@
 from __future__ import annotations
 
 from http import HTTPStatus
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from fastapi import HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from starlette.responses import JSONResponse
-
-
-def problem(
-    *,
-    status: int,
-    title: str,
-    detail: str,
-    type_: str = "about:blank",
-    extras: Optional[Dict[str, Any]] = None,
-    correlation_id: Optional[str] = None,
-) -> JSONResponse:
-    """RFC 7807 problem+json payload + корректный media type."""
-    payload: Dict[str, Any] = {
-        "type": type_,
-        "title": title,
-        "status": status,
-        "detail": detail,
-        "correlation_id": correlation_id,
-    }
-    if extras:
-        payload.update(extras)
-    return JSONResponse(payload, status_code=status, media_type="application/problem+json")
+from pydantic import ValidationError
+from starlette.responses import Response
+
+from app.common.problem import PROBLEM_MEDIA_TYPE, ProblemType, problem, problem_payload
+from app.common.responses import FastJSONResponse
+
+__all__ = [
+    "ApiError",
+    "api_error_handler",
+    "api_error_payload",
+    "http_exception_handler",
+    "problem",
+    "problem_payload",
+    "request_validation_handler",
+    "validation_api_error",
+]
 
 
 class ApiError(Exception):
@@ -47,24 +40,51 @@ class ApiError(Exception):
         self.type_ = type_
         self.code = code
         self.extras = extras or {}
+        self.problem_type: Optional[ProblemType] = None
+
+    @classmethod
+    def from_type(cls, ptype: ProblemType) -> "ApiError":
+        """Ошибка по заранее сериализованному типу — ответ без повторной сборки JSON."""
+        exc = cls(
+            ptype.status,
+            ptype.title,
+            ptype.detail,
+            code=ptype.code,
+            type_=ptype.type_,
+            extras=ptype.extras,
+        )
+        exc.problem_type = ptype
+        return exc
 
 
-async def api_error_handler(request: Request, exc: ApiError) -> JSONResponse:
-    cid = getattr(request.state, "correlation_id", None)
+def api_error_payload(exc: ApiError, correlation_id: Optional[str] = None) -> Dict[str, Any]:
+    if exc.problem_type is not None:
+        return exc.problem_type.payload(correlation_id)
     extras = dict(exc.extras)
     if exc.code is not None:
         extras.setdefault("error_code", exc.code)
-    return problem(
+    return problem_payload(
         status=exc.status,
         title=exc.title,
         detail=exc.detail,
         type_=exc.type_,
         extras=extras,
-        correlation_id=cid,
+        correlation_id=correlation_id,
+    )
+
+
+async def api_error_handler(request: Request, exc: ApiError) -> Response:
+    cid = getattr(request.state, "correlation_id", None)
+    if exc.problem_type is not None:
+        return exc.problem_type.response(cid)
+    return FastJSONResponse(
+        api_error_payload(exc, cid),
+        status_code=exc.status,
+        media_type=PROBLEM_MEDIA_TYPE,
     )
 
 
-async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
+async def http_exception_handler(request: Request, exc: HTTPException) -> FastJSONResponse:
     """
     Приводит любые FastAPI HTTPException к RFC7807.
     - 5xx: маскируем detail
@@ -91,28 +111,50 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
     )
 
 
-async def request_validation_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+VALIDATION_PROBLEM_TYPE = "https://example.com/problems/validation-error"
+
+
+def _field_errors(
+    errors: Iterable[Dict[str, Any]], loc_prefix: Tuple[Any, ...] = ()
+) -> List[Dict[str, Any]]:
+    # loc: ('body','field') -> 'body.field'
+    return [
+        {
+            "loc": ".".join(str(x) for x in (*loc_prefix, *e.get("loc", ()))),
+            "msg": e.get("msg"),
+            "type": e.get("type"),
+        }
+        for e in errors
+    ]
+
+
+def validation_api_error(exc: ValidationError, loc_prefix: Tuple[Any, ...] = ("body",)) -> ApiError:
+    """
+    ValidationError схемы, проверенной вручную (строка batch-запроса), →
+    ApiError 422 в том же формате, что и request_validation_handler.
+    """
+    return ApiError(
+        422,
+        "Unprocessable Entity",
+        "Request validation failed",
+        code="validation_error",
+        type_=VALIDATION_PROBLEM_TYPE,
+        extras={"errors": _field_errors(exc.errors(), loc_prefix)},
+    )
+
+
+async def request_validation_handler(
+    request: Request, exc: RequestValidationError
+) -> FastJSONResponse:
     """
     Pydantic-валидация → RFC7807 с расширением 'errors' (список полей).
     """
     cid = getattr(request.state, "correlation_id", None)
-    errors: List[Dict[str, Any]] = []
-    for e in exc.errors():
-        # loc: ('body','field') -> 'body.field'
-        loc = ".".join(str(x) for x in e.get("loc", []))
-        errors.append(
-            {
-                "loc": loc,
-                "msg": e.get("msg"),
-                "type": e.get("type"),
-            }
-        )
-
     return problem(
         status=422,
         title="Unprocessable Entity",
         detail="Request validation failed",
-        type_="https://example.com/problems/validation-error",
-        extras={"errors": errors, "error_code": "validation_error"},
+        type_=VALIDATION_PROBLEM_TYPE,
+        extras={"errors": _field_errors(exc.errors()), "error_code": "validation_error"},
         correlation_id=cid,
     )
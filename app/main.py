@@ -1,7 +1,15 @@
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
 from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 
+from app import settings
 from app.api.routes import items, uploads, workouts
+from app.common import http_client
+from app.common.responses import FastJSONResponse
+from app.common.upload import shutdown_io_executor
+from app.db import close_db
 from app.errors import (
     ApiError,
     api_error_handler,
@@ -9,19 +17,37 @@ from app.errors import (
     request_validation_handler,
 )
 from app.middleware.correlation import CorrelationIdMiddleware
-from app.middleware_errors import ProblemJSONMiddleware
 
 
-def create_app() -> FastAPI:
-    app = FastAPI(title="SecDev Course App", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    http_client.get_client()
+    yield
+    await http_client.aclose_client()
+    shutdown_io_executor()
+    close_db()
+
 
-    app.add_middleware(ProblemJSONMiddleware)
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="SecDev Course App",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse,
+    )
+
+    # correlation id + RFC 7807 для необработанных исключений — одна ASGI-прослойка
     app.add_middleware(CorrelationIdMiddleware)
 
     @app.get("/health")
     def health():
         return {"status": "ok"}
 
+    @app.get("/metrics")
+    def metrics():
+        return {"workouts_list_cache": workouts.LIST_CACHE.stats()}
+
     # роутеры
     app.include_router(items.router)
     app.include_router(workouts.router)
@@ -1,25 +1,65 @@
+import itertools
+import os
 import re
-from uuid import uuid4
 
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware_errors import internal_error_response
 
 HEADER = b"x-correlation-id"
 _ALLOWED_RE = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
 
 
+def _random_prefix() -> str:
+    h = os.urandom(12).hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-"
+
+
+_prefix = _random_prefix()
+_counter = itertools.count()
+
+
+def _reseed() -> None:
+    # после fork (gunicorn/uvicorn --workers) у каждого воркера свой префикс
+    global _prefix, _counter
+    _prefix = _random_prefix()
+    _counter = itertools.count()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed)
+
+
+def new_correlation_id() -> str:
+    """
+    Id в UUID-формате (8-4-4-4-12): случайный префикс процесса + счётчик.
+    Дешевле str(uuid4()) — без urandom и форматирования UUID на каждый запрос;
+    id не секретен, нужна только уникальность.
+    """
+    return f"{_prefix}{next(_counter) & 0xFFFFFFFFFFFF:012x}"
+
+
 def _sanitize_correlation_id(raw: str | None) -> str:
-    """Разрешаем только безопасный ASCII-токен 1..64, иначе генерируем UUID4."""
+    """Разрешаем только безопасный ASCII-токен 1..64, иначе генерируем новый id."""
     if not raw:
-        return str(uuid4())
+        return new_correlation_id()
     s = raw.strip()
     if "\r" in s or "\n" in s:
-        return str(uuid4())
+        return new_correlation_id()
     if not _ALLOWED_RE.fullmatch(s):
-        return str(uuid4())
+        return new_correlation_id()
     return s
 
 
 class CorrelationIdMiddleware:
+    """
+    Единая ASGI-прослойка на запрос:
+    - один проход по заголовкам запроса и не больше одного сгенерированного id;
+    - id кладётся в scope["state"] (его читают обработчики ошибок) и один раз
+      дописывается в заголовки ответа;
+    - необработанное исключение до начала ответа -> RFC 7807 (500).
+    """
+
     def __init__(self, app: ASGIApp):
         self.app = app
 
@@ -39,16 +79,26 @@ class CorrelationIdMiddleware:
             else None
         )
         cid_str = _sanitize_correlation_id(raw)
+        cid_header = (HEADER, cid_str.encode("ascii"))
 
         scope.setdefault("state", {})["correlation_id"] = cid_str
+        started = False
 
-        async def send_wrapper(message):
+        async def send_wrapper(message: Message):
+            nonlocal started
             if message["type"] == "http.response.start":
+                started = True
                 headers = [
                     (k, v) for (k, v) in (message.get("headers") or []) if k.lower() != HEADER
                 ]
-                headers.append((HEADER, cid_str.encode("ascii")))
+                headers.append(cid_header)
                 message = {**message, "headers": headers}
             await send(message)
 
-        await self.app(scope, receive, send_wrapper)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            if started:
+                # заголовки уже ушли клиенту — корректный 500 отдать нельзя
+                raise
+            await internal_error_response(e, cid_str)(scope, receive, send_wrapper)
@@ -7,7 +7,7 @@ class WorkoutIn(BaseModel):
     title: str = Field(min_length=1, max_length=100)
     date: dt.date = Field(default_factory=dt.date.today)
     notes: str | None = None
-    duration_min: int | None = Field(default=None, ge=1, le=1440)
+    duration_min: int = Field(default=1, ge=1, le=1440)
 
 
 class WorkoutOut(WorkoutIn):
@@ -19,3 +19,9 @@ class WorkoutUpdate(BaseModel):
     date: dt.date | None = None
     notes: str | None = None
     duration_min: int | None = Field(default=None, ge=1, le=1440)
+
+
+class WorkoutStatsBucket(BaseModel):
+    period: dt.date
+    count: int
+    total_duration_min: int
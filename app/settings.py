@@ -5,7 +5,66 @@ def get_upload_dir() -> str:
     return os.getenv("UPLOAD_DIR", "./var/uploads")
 
 
+def get_storage_backend() -> str:
+    """memory (по умолчанию) | sqlite | log"""
+    return os.getenv("STORAGE_BACKEND", "memory").strip().lower()
+
+
+def get_sqlite_path() -> str:
+    return os.getenv("SQLITE_PATH", "./var/app.db")
+
+
+def get_wal_dir() -> str:
+    """Каталог WAL и снапшотов для STORAGE_BACKEND=memory; пусто — без журнала."""
+    return os.getenv("WAL_DIR", "").strip()
+
+
+def get_log_path() -> str:
+    """Файл mmap-лога для STORAGE_BACKEND=log; /dev/shm/... — только в RAM."""
+    return os.getenv("LOG_PATH", "./var/app.log")
+
+
 HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
 HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "2.0"))
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "5.0"))
+# бюджет ретраев на хост (token bucket) и circuit breaker на хост
+HTTP_RETRY_BUDGET_BURST = float(os.getenv("HTTP_RETRY_BUDGET_BURST", "10"))
+HTTP_RETRY_BUDGET_RATE = float(os.getenv("HTTP_RETRY_BUDGET_RATE", "1.0"))
+HTTP_CB_FAILURE_THRESHOLD = int(os.getenv("HTTP_CB_FAILURE_THRESHOLD", "5"))
+HTTP_CB_RESET_TIMEOUT = float(os.getenv("HTTP_CB_RESET_TIMEOUT", "30.0"))
 HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2.0"))
 HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5.0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP_FANOUT_CONCURRENCY = int(os.getenv("HTTP_FANOUT_CONCURRENCY", "10"))
+HTTP_STREAM_MAX_BYTES = int(os.getenv("HTTP_STREAM_MAX_BYTES", "10000000"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "256"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", "8000000"))
+
+# кеш готовых ответов GET /workouts (LRU): записей и байт тел
+WORKOUTS_CACHE_MAX_ENTRIES = int(os.getenv("WORKOUTS_CACHE_MAX_ENTRIES", "256"))
+WORKOUTS_CACHE_MAX_BYTES = int(os.getenv("WORKOUTS_CACHE_MAX_BYTES", "8000000"))
+
+# пагинация списков: limit по умолчанию и жёсткий потолок
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "1000"))
+
+# максимум строк в одном batch-запросе /workouts:batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# потоки под блокирующий файловый I/O загрузок (write/fsync)
+UPLOAD_IO_WORKERS = int(os.getenv("UPLOAD_IO_WORKERS", "4"))
+
+# потоки anyio под sync-роуты (по умолчанию у anyio — 40); хранилище потокобезопасно
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# соединений в пуле STORAGE_BACKEND=sqlite; сверх них потоки ждут свободное
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+# компакция лога STORAGE_BACKEND=log: не раньше этого размера и удвоения с прошлого среза
+LOG_COMPACT_MIN_BYTES = int(os.getenv("LOG_COMPACT_MIN_BYTES", str(16 << 20)))
+
+# снапшот in-memory хранилища после стольких записей в WAL
+WAL_SNAPSHOT_EVERY = int(os.getenv("WAL_SNAPSHOT_EVERY", "100000"))
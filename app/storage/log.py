@@ -0,0 +1,325 @@
+"""
+Общее для нескольких процессов хранилище на mmap-логе (STORAGE_BACKEND=log).
+- файл LOG_PATH — append-only лог операций (insert/update/delete/clear),
+  отображённый в память каждым воркером uvicorn; положите его в /dev/shm,
+  чтобы данные жили только в RAM;
+- каждый воркер держит свои in-memory таблицы (Table/WorkoutTable со всеми
+  индексами) и перед операцией доигрывает в них хвост лога;
+- запись — под flock на файл: доиграть хвост, дописать запись, применить её
+  локально. id выдаются детерминированно при воспроизведении, поэтому у всех
+  воркеров они совпадают;
+- компакция: когда лог вырос вдвое с прошлого среза (и не меньше
+  compact_min_bytes), писатель под flock сбрасывает живые строки restore-
+  записями (Table.dump) в новый файл и атомарно подменяет им LOG_PATH.
+  Старый файл не переписывается — в нём только ставится флаг moved, увидев
+  который воркеры переоткрывают путь и загружают срез.
+
+Формат: заголовок 40 байт (magic + длина зафиксированной части лога, u64 +
+epoch версий + длина среза после компакции, u64 + флаг moved, u64), далее
+записи [u32 длина][JSON]. Длина в заголовке обновляется после записи тела,
+так что читатель без замка видит только целые записи. epoch задаётся при
+создании файла, общий для всех воркеров и переживает компакцию: версии
+строк (ETag) у них совпадают. Файл прежнего формата (SECDLOG2, без среза)
+при открытии воспроизводится и переписывается компакцией.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import fcntl
+import json
+import mmap
+import os
+from pathlib import Path
+import secrets
+import struct
+import threading
+from typing import Any, Callable, Container, Dict, Iterator, List, Optional, Tuple
+
+from app.common.responses import dumps
+from app.db import DateKey, DayTotal, Row, Table, WorkoutTable, check_version
+
+_MAGIC = b"SECDLOG3"
+_HEADER = struct.Struct("<8sQ8sQQ")
+# прежний формат: magic, длина, epoch — без среза и флага moved
+_MAGIC_V2 = b"SECDLOG2"
+_HEADER_V2 = struct.Struct("<8sQ8s")
+_LEN = struct.Struct("<I")
+_INITIAL_SIZE = 1 << 20
+
+
+class RecordLog:
+    """Лог операций в mmap-файле + локальные таблицы, в которые он воспроизводится."""
+
+    def __init__(
+        self,
+        path: str,
+        make_tables: Callable[[str], Dict[str, Table]],
+        compact_min_bytes: int = 16 << 20,
+    ) -> None:
+        self.path = path
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._fd = self._open()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size < _HEADER.size:
+                    os.ftruncate(self._fd, _INITIAL_SIZE)
+                    epoch = secrets.token_hex(4).encode()
+                    os.pwrite(self._fd, _HEADER.pack(_MAGIC, _HEADER.size, epoch, 0, 0), 0)
+                self._mm = mmap.mmap(self._fd, 0)
+                magic = self._mm[:8]
+                if magic == _MAGIC_V2:
+                    self._upgrade(make_tables)
+                elif magic != _MAGIC:
+                    raise ValueError(f"{path} is not a record log")
+                else:
+                    # epoch компакция сохраняет: годится, даже если файл уже moved
+                    self.tables = make_tables(self._epoch().decode())
+                    self._offset = _HEADER.size
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.sync()
+
+    def _open(self) -> int:
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _committed(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[1]
+
+    def _epoch(self) -> bytes:
+        return _HEADER.unpack_from(self._mm, 0)[2]
+
+    def _base(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[3]
+
+    def _moved(self) -> bool:
+        return bool(_HEADER.unpack_from(self._mm, 0)[4])
+
+    def _set_committed(self, end: int) -> None:
+        _HEADER.pack_into(self._mm, 0, _MAGIC, end, self._epoch(), self._base(), 0)
+
+    def _lock_file(self) -> None:
+        """flock на актуальный файл пути: пока ждали замка, его могла сменить компакция."""
+        while True:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            if not self._moved():
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._reopen()
+
+    def _remap(self, need: int) -> None:
+        if need > len(self._mm):
+            self._mm.close()
+            self._mm = mmap.mmap(self._fd, 0)
+
+    def _reopen(self) -> None:
+        """Файл по пути сменила компакция: переоткрываем и читаем его с начала."""
+        self._mm.close()
+        os.close(self._fd)
+        self._fd = self._open()
+        self._mm = mmap.mmap(self._fd, 0)
+        self._offset = _HEADER.size
+
+    def _replay(self, start: int, end: int) -> None:
+        mm, pos = self._mm, start
+        while pos < end:
+            (size,) = _LEN.unpack_from(mm, pos)
+            pos += _LEN.size
+            self._apply(json.loads(mm[pos : pos + size]))
+            pos += size
+
+    def _catch_up(self) -> None:
+        # moved ставится после последней записи старого файла и после rename:
+        # новый файл начинается со среза, который заменяет таблицы целиком
+        while self._moved():
+            self._reopen()
+        end = self._committed()
+        if end == self._offset:
+            return
+        self._remap(end)
+        self._replay(self._offset, end)
+        self._offset = end
+
+    def _apply(self, record: List[Any]) -> Any:
+        op, name, *args = record
+        return getattr(self.tables[name], op)(*args)
+
+    def sync(self) -> None:
+        """Доигрывает записи других воркеров; без новых записей — только чтение заголовка."""
+        # под замком: другой поток может переотображать файл (_remap)
+        with self._lock:
+            self._catch_up()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """Эксклюзивная запись: замок потоков процесса + flock между процессами."""
+        with self._lock:
+            self._lock_file()
+            try:
+                self._catch_up()
+                yield
+                if self._offset >= max(self.compact_min_bytes, 2 * self._base()):
+                    self._compact()
+            finally:
+                # после компакции self._fd — уже новый файл, замок держим на нём
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def append(self, *record: Any) -> Any:
+        """Дописывает запись в лог и применяет её локально; только внутри writing()."""
+        body = dumps(list(record))
+        end = self._offset + _LEN.size + len(body)
+        if end > len(self._mm):
+            os.ftruncate(self._fd, max(end, 2 * len(self._mm)))
+            self._remap(end)
+        _LEN.pack_into(self._mm, self._offset, len(body))
+        self._mm[self._offset + _LEN.size : end] = body
+        self._set_committed(end)
+        self._offset = end
+        return self._apply(list(record))
+
+    def _compact(self, epoch: Optional[bytes] = None) -> None:
+        """
+        Срез живых строк (restore-записи) в новый файл, rename поверх пути,
+        флаг moved в старом. Только под flock: таблицы совпадают с логом.
+        Стоит O(живых строк), но случается, лишь когда лог вырос вдвое.
+        """
+        epoch = epoch or self._epoch()
+        records = [dumps(["restore", name, t.dump()]) for name, t in self.tables.items()]
+        body = b"".join(_LEN.pack(len(r)) + r for r in records)
+        end = _HEADER.size + len(body)
+        tmp = f"{self.path}.compact"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            # замок на новом файле до rename: писать в него раньше нас никто не начнёт
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, max(_INITIAL_SIZE, 2 * end))
+            os.pwrite(fd, _HEADER.pack(_MAGIC, end, epoch, end, 0) + body, 0)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.close(fd)
+            raise
+        # старый файл мог быть прежнего формата: пишем поверх заголовок нового с moved
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self._offset, epoch, 0, 1)
+        self._mm.close()
+        os.close(self._fd)
+        self._fd = fd
+        self._mm = mmap.mmap(fd, 0)
+        self._offset = end
+
+    def _upgrade(self, make_tables: Callable[[str], Dict[str, Table]]) -> None:
+        """Файл SECDLOG2 (под flock): воспроизвести целиком и переписать компакцией."""
+        _, end, epoch = _HEADER_V2.unpack_from(self._mm, 0)
+        self.tables = make_tables(epoch.decode())
+        self._replay(_HEADER_V2.size, end)
+        self._offset = _HEADER.size
+        self._compact(epoch)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.close()
+            os.close(self._fd)
+
+
+class LogTable:
+    """RowStore поверх RecordLog: чтения — из локальной таблицы, записи — через лог."""
+
+    def __init__(self, log: RecordLog, name: str) -> None:
+        self._log = log
+        self._name = name
+        self._table = log.tables[name]
+
+    def __len__(self) -> int:
+        self._log.sync()
+        return len(self._table)
+
+    def __iter__(self) -> Iterator[Row]:
+        self._log.sync()
+        return iter(self._table)
+
+    def insert(self, row: Row) -> Row:
+        with self._log.writing():
+            return self._log.append("insert", self._name, row)
+
+    def get(self, row_id: int) -> Optional[Row]:
+        self._log.sync()
+        return self._table.get(row_id)
+
+    @property
+    def version(self) -> str:
+        self._log.sync()
+        return self._table.version
+
+    def row_version(self, row_id: int) -> Optional[str]:
+        self._log.sync()
+        return self._table.row_version(row_id)
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]:
+        versioned = self.update_versioned(row_id, changes, if_match=if_match)
+        return None if versioned is None else versioned[0]
+
+    def update_versioned(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Tuple[Row, str]]:
+        with self._log.writing():
+            current = self._table.row_version(row_id)
+            if current is None:
+                return None
+            check_version(current, if_match)
+            row = self._log.append("update", self._name, row_id, changes)
+            return row, self._table.row_version(row_id)
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool:
+        with self._log.writing():
+            current = self._table.row_version(row_id)
+            if current is None:
+                return False
+            check_version(current, if_match)
+            return self._log.append("delete", self._name, row_id)
+
+    def clear(self) -> None:
+        with self._log.writing():
+            self._log.append("clear", self._name)
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        # fsync лог не делает: запись видна другим воркерам сразу после append
+        yield
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]:
+        self._log.sync()
+        return self._table.page(after, limit)
+
+
+class LogWorkoutTable(LogTable):
+    _table: WorkoutTable
+
+    def range(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        after: Optional[DateKey] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]:
+        self._log.sync()
+        return self._table.range(date_from, date_to, after=after, limit=limit)
+
+    def day_totals(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> List[DayTotal]:
+        self._log.sync()
+        return self._table.day_totals(date_from, date_to)
+
+
+def open_log_db(path: str, compact_min_bytes: int = 16 << 20) -> Dict[str, Any]:
+    log = RecordLog(
+        path,
+        lambda epoch: {"items": Table(epoch), "workouts": WorkoutTable(epoch)},
+        compact_min_bytes,
+    )
+    return {"items": LogTable(log, "items"), "workouts": LogWorkoutTable(log, "workouts")}
@@ -0,0 +1,337 @@
+"""
+SQLite-бэкенд хранилища (journal_mode=WAL).
+- ограниченный пул соединений: соединение берётся на одну операцию хранилища
+  (FastAPI гоняет sync-роуты в threadpool, чьи потоки anyio то гасит, то заводит);
+- SQL-тексты константные и параметризованные -> переиспользуются из кеша
+  подготовленных выражений sqlite3;
+- AUTOINCREMENT: id монотонны и не переиспользуются, как в in-memory Table;
+- индекс (date, id) под диапазоны и keyset-пагинацию /workouts;
+- итоги по дням (workout_days) ведут триггеры — в той же транзакции, что и запись;
+- версии (ETag): счётчик таблицы в store_versions и колонка version строки
+  меняются той же транзакцией; epoch счётчика задаётся при создании файла.
+Несколько процессов uvicorn могут работать с одним файлом: WAL допускает
+параллельных читателей и одного писателя.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import queue
+import sqlite3
+import threading
+from typing import Any, Container, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.db import DateKey, DayTotal, Row, check_version
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS workouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    notes TEXT,
+    duration_min INTEGER,
+    date TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS workouts_date_id ON workouts (date, id);
+CREATE TABLE IF NOT EXISTS store_versions (
+    name TEXT PRIMARY KEY,
+    epoch TEXT NOT NULL,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workout_days (
+    date TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS workout_days_ins AFTER INSERT ON workouts BEGIN
+    INSERT INTO workout_days (date, count, total)
+    VALUES (NEW.date, 1, coalesce(NEW.duration_min, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        count = count + 1, total = total + coalesce(NEW.duration_min, 0);
+END;
+CREATE TRIGGER IF NOT EXISTS workout_days_del AFTER DELETE ON workouts BEGIN
+    UPDATE workout_days
+    SET count = count - 1, total = total - coalesce(OLD.duration_min, 0)
+    WHERE date = OLD.date;
+    DELETE FROM workout_days WHERE date = OLD.date AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS workout_days_upd
+AFTER UPDATE OF date, duration_min ON workouts BEGIN
+    UPDATE workout_days
+    SET count = count - 1, total = total - coalesce(OLD.duration_min, 0)
+    WHERE date = OLD.date;
+    DELETE FROM workout_days WHERE date = OLD.date AND count = 0;
+    INSERT INTO workout_days (date, count, total)
+    VALUES (NEW.date, 1, coalesce(NEW.duration_min, 0))
+    ON CONFLICT (date) DO UPDATE SET
+        count = count + 1, total = total + coalesce(NEW.duration_min, 0);
+END;
+"""
+
+# файл, созданный до появления workout_days: итоги один раз пересчитываются из строк
+_BACKFILL_DAYS = """
+INSERT INTO workout_days (date, count, total)
+SELECT date, count(*), sum(coalesce(duration_min, 0)) FROM workouts GROUP BY date
+"""
+
+# файл, созданный до появления версий: колонка добавляется, строкам — версия 0
+_VERSIONED = ("items", "workouts")
+_ADD_VERSION = "ALTER TABLE {} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+_INIT_VERSION = """
+INSERT OR IGNORE INTO store_versions (name, epoch, version)
+VALUES (?, lower(hex(randomblob(4))), 0)
+"""
+
+# верхняя граница для ISO-дат: любая 'YYYY-MM-DD' меньше
+_DATE_MAX = "9999-99-99"
+
+
+class ConnectionPool:
+    """
+    Не больше size соединений на файл, открываются лениво. Соединение выдаётся
+    на одну операцию и возвращается в пул: сколько бы потоков ни сменил
+    threadpool, новых соединений это не открывает. LIFO — чаще всего берётся
+    «горячее» соединение с заполненным кешем выражений.
+    """
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self._idle: "queue.LifoQueue[Optional[sqlite3.Connection]]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+        self._closed = False
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self.conn() as conn:
+            conn.executescript(_SCHEMA)
+            with conn:
+                # замок записи до проверок: воркеры, стартующие разом, ждут друг друга,
+                # и миграцию делает ровно один — остальные уже видят её результат
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM workout_days)").fetchone()[0]:
+                    conn.execute(_BACKFILL_DAYS)
+                for name in _VERSIONED:
+                    columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({name})")}
+                    if "version" not in columns:
+                        conn.execute(_ADD_VERSION.format(name))
+                    conn.execute(_INIT_VERSION, (name,))
+
+    def _open(self) -> sqlite3.Connection:
+        # поток-владелец меняется от операции к операции, но одновременно
+        # соединением пользуется только тот, кто взял его из пула
+        conn = sqlite3.connect(
+            self.path, timeout=5.0, cached_statements=128, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def conn(self) -> Iterator[sqlite3.Connection]:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        conn = self._idle.get()
+        try:
+            if conn is None:
+                conn = self._open()
+            yield conn
+        finally:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if self._closed and conn is not None:
+                    conn.close()
+                    conn = None
+                self._idle.put(conn)
+
+    def close(self) -> None:
+        """Закрывает свободные соединения; занятые закроются при возврате в пул."""
+        with self._lock:
+            self._closed = True
+            drained = []
+            while True:
+                try:
+                    drained.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for conn in drained:
+                if conn is not None:
+                    conn.close()
+                self._idle.put(None)
+
+
+class SqliteTable:
+    def __init__(self, pool: ConnectionPool, name: str, columns: Sequence[str]) -> None:
+        self._pool = pool
+        self._name = name
+        self._columns = tuple(columns)
+        # имена таблиц/колонок — константы модуля, значения идут только через "?"
+        cols = ", ".join(("id", *self._columns))
+        placeholders = ", ".join("?" for _ in self._columns)
+        self._sql_select = f"SELECT {cols} FROM {name}"  # noqa: S608
+        self._sql_get = f"{self._sql_select} WHERE id = ?"
+        self._sql_page = f"{self._sql_select} WHERE id > ? ORDER BY id LIMIT ?"
+        self._sql_count = f"SELECT count(*) FROM {name}"  # noqa: S608
+        self._sql_insert = (
+            f"INSERT INTO {name} ({', '.join(self._columns)}, version) "  # noqa: S608
+            f"VALUES ({placeholders}, ?)"
+        )
+        self._sql_delete = f"DELETE FROM {name} WHERE id = ?"  # noqa: S608
+        self._sql_clear = f"DELETE FROM {name}"  # noqa: S608
+        self._sql_row_version = f"SELECT version FROM {name} WHERE id = ?"  # noqa: S608
+        self._sql_version = "SELECT version FROM store_versions WHERE name = ?"
+        self._sql_bump = (
+            "UPDATE store_versions SET version = version + 1 WHERE name = ? RETURNING version"
+        )
+        row = self._fetchone("SELECT epoch FROM store_versions WHERE name = ?", (name,))
+        self._epoch = row[0]
+
+    def _fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        with self._pool.conn() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        with self._pool.conn() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _token(self, stamp: int) -> str:
+        return f"{self._epoch}.{stamp}"
+
+    def _bump(self, conn: sqlite3.Connection) -> int:
+        # первая запись транзакции: дальше в ней мы уже держим замок записи файла,
+        # и проверка If-Match не разойдётся с изменением строки
+        return conn.execute(self._sql_bump, (self._name,)).fetchone()[0]
+
+    def _locked_row_version(self, conn: sqlite3.Connection, row_id: int) -> Optional[str]:
+        r = conn.execute(self._sql_row_version, (row_id,)).fetchone()
+        return None if r is None else self._token(r[0])
+
+    @property
+    def version(self) -> str:
+        return self._token(self._fetchone(self._sql_version, (self._name,))[0])
+
+    def row_version(self, row_id: int) -> Optional[str]:
+        r = self._fetchone(self._sql_row_version, (row_id,))
+        return None if r is None else self._token(r[0])
+
+    def __len__(self) -> int:
+        return self._fetchone(self._sql_count)[0]
+
+    def __iter__(self) -> Iterator[Row]:
+        return iter(self.page())
+
+    def insert(self, row: Row) -> Row:
+        values = [row.get(c) for c in self._columns]
+        with self._pool.conn() as conn, conn:
+            cur = conn.execute(self._sql_insert, [*values, self._bump(conn)])
+        return {"id": cur.lastrowid, **dict(zip(self._columns, values, strict=True))}
+
+    def get(self, row_id: int) -> Optional[Row]:
+        r = self._fetchone(self._sql_get, (row_id,))
+        return dict(r) if r is not None else None
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]:
+        versioned = self.update_versioned(row_id, changes, if_match=if_match)
+        return None if versioned is None else versioned[0]
+
+    def update_versioned(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Tuple[Row, str]]:
+        cols = [c for c in self._columns if c in changes]
+        sets = "".join(f"{c} = ?, " for c in cols)
+        with self._pool.conn() as conn, conn:
+            version = self._bump(conn)
+            current = self._locked_row_version(conn, row_id)
+            if current is None:
+                conn.rollback()
+                return None
+            check_version(current, if_match)
+            conn.execute(
+                f"UPDATE {self._name} SET {sets}version = ? WHERE id = ?",  # noqa: S608
+                [*(changes[c] for c in cols), version, row_id],
+            )
+            r = conn.execute(self._sql_get, (row_id,)).fetchone()
+        return dict(r), self._token(version)
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool:
+        with self._pool.conn() as conn, conn:
+            self._bump(conn)
+            current = self._locked_row_version(conn, row_id)
+            if current is None:
+                conn.rollback()
+                return False
+            check_version(current, if_match)
+            conn.execute(self._sql_delete, (row_id,))
+        return True
+
+    def clear(self) -> None:
+        with self._pool.conn() as conn, conn:
+            self._bump(conn)
+            conn.execute(self._sql_clear)
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (self._name,))
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        # строки пачки независимы — каждая своей транзакцией; synchronous=NORMAL
+        # в WAL-режиме и так не делает fsync на каждый commit
+        yield
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]:
+        rows = self._fetchall(self._sql_page, (after, -1 if limit is None else limit))
+        return [dict(r) for r in rows]
+
+
+class SqliteWorkoutTable(SqliteTable):
+    def __init__(self, pool: ConnectionPool) -> None:
+        super().__init__(pool, "workouts", ("title", "notes", "duration_min", "date"))
+        # один SQL-текст на все комбинации фильтров: отсутствующие границы
+        # подставляются сентинелами, выражение остаётся в кеше подготовленных
+        self._sql_range = (
+            f"{self._sql_select} WHERE date >= ? AND date <= ? AND (date, id) > (?, ?) "
+            "ORDER BY date, id LIMIT ?"
+        )
+        self._sql_day_totals = "SELECT date, count, total FROM workout_days WHERE date >= ? AND date <= ? ORDER BY date"
+
+    def range(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        after: Optional[DateKey] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]:
+        after_date, after_id = after if after is not None else ("", 0)
+        params: List[Any] = [
+            date_from or "",
+            date_to or _DATE_MAX,
+            after_date,
+            after_id,
+            -1 if limit is None else limit,
+        ]
+        return [dict(r) for r in self._fetchall(self._sql_range, params)]
+
+    def day_totals(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> List[DayTotal]:
+        params = (date_from or "", date_to or _DATE_MAX)
+        return [tuple(r) for r in self._fetchall(self._sql_day_totals, params)]
+
+
+def open_sqlite_db(path: str, pool_size: int = 4) -> Dict[str, Any]:
+    pool = ConnectionPool(path, pool_size)
+    return {
+        "items": SqliteTable(pool, "items", ("name",)),
+        "workouts": SqliteWorkoutTable(pool),
+    }
@@ -0,0 +1,425 @@
+"""
+Журнал предзаписи (WAL) и снапшоты для in-memory хранилища (WAL_DIR).
+- данные по-прежнему живут в Table/WorkoutTable, журнал нужен только для рестарта;
+- каждая запись (insert/update/delete/clear) — строка JSON в текущем сегменте
+  wal-<gen>.log; ответ уходит клиенту только после fsync её сегмента;
+- group commit: fsync делает отдельный поток, и пока он ждёт диск, новые
+  записи копятся в буфере и уходят следующим одним write+fsync;
+- каждые WAL_SNAPSHOT_EVERY записей — снапшот snapshot-<gen>.json (состояние
+  на начало сегмента gen), после него старые сегменты удаляются;
+- старт: последний снапшот + все сегменты с gen не меньше его; оборванная при
+  падении последняя строка сегмента пропускается;
+- снапшот пишет отдельный поток wal-snapshot, не запрос, на котором он созрел;
+- сбой write/fsync: ждущие записи получают WalError, таблицы откатываются к
+  подтверждённому состоянию, новые записи отклоняются (см. WriteAheadLog).
+"""
+
+from __future__ import annotations
+
+from contextlib import ExitStack, contextmanager, suppress
+import gc
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Any, BinaryIO, Container, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from app.common.responses import dumps, loads
+from app.db import DateKey, DayTotal, Row, Table, WorkoutTable, check_version
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_RE = re.compile(r"^wal-(\d{8})\.log$")
+_SNAPSHOT_RE = re.compile(r"^snapshot-(\d{8})\.json$")
+
+
+def _segment_name(gen: int) -> str:
+    return f"wal-{gen:08d}.log"
+
+
+def _snapshot_name(gen: int) -> str:
+    return f"snapshot-{gen:08d}.json"
+
+
+def _generations(directory: Path, pattern: re.Pattern) -> List[int]:
+    return sorted(int(m.group(1)) for p in directory.iterdir() if (m := pattern.match(p.name)))
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def dump_state(tables: Dict[str, Table]) -> Dict[str, Any]:
+    return {name: table.dump() for name, table in tables.items()}
+
+
+def write_snapshot(directory: Path, gen: int, state: Dict[str, Any]) -> None:
+    """Атомарно пишет снапшот: tmp-файл, fsync, rename."""
+    tmp = directory / (_snapshot_name(gen) + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(dumps(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, directory / _snapshot_name(gen))
+    _fsync_dir(directory)
+
+
+def _apply(tables: Dict[str, Table], record: List[Any]) -> Any:
+    op, name, *args = record
+    return getattr(tables[name], op)(*args)
+
+
+def _replay_segment(path: Path, tables: Dict[str, Table], size: Optional[int] = None) -> int:
+    """Воспроизводит сегмент (или его первые size байт — подтверждённую fsync часть)."""
+    count = pos = 0
+    with open(path, "rb") as f:
+        for line in f:
+            pos += len(line)
+            if not line.endswith(b"\n") or (size is not None and pos > size):
+                break  # недописанная при падении запись: клиенту она не подтверждена
+            _apply(tables, loads(line))
+            count += 1
+    return count
+
+
+class WalError(RuntimeError):
+    """Журнал не смог записать/fsync-нуть сегмент; дальнейшие записи отклоняются."""
+
+
+class WriteAheadLog:
+    """
+    Запись применяется к таблицам сразу, до fsync (read-uncommitted): другие
+    потоки могут прочесть строку, которую клиенту ещё не подтвердили. Если
+    write/fsync падает, журнал переходит в состояние ошибки: ждущие commit()
+    получают WalError, новые записи отклоняются, а таблицы откатываются к
+    подтверждённому состоянию — снапшот + сегменты до последнего удачного fsync.
+    """
+
+    def __init__(self, directory: str, tables: Dict[str, Table], snapshot_every: int) -> None:
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.tables = tables
+        self.snapshot_every = snapshot_every
+        # _write_lock упорядочивает «применить + поставить в буфер»; _cond — буфер и fsync
+        self._write_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._buf: List[bytes] = []
+        self._appended = 0
+        self._durable = 0
+        self._durable_bytes = 0  # подтверждённая fsync длина текущего сегмента
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        # незакоммиченный билет deferred()-блока потока; None — вне блока
+        self._local = threading.local()
+        self._since_snapshot = self._recover()
+        self._gen = max(_generations(self.dir, _SEGMENT_RE), default=0) + 1
+        self._file: BinaryIO = open(self.dir / _segment_name(self._gen), "ab")
+        # снапшот пишет свой поток: запрос, на котором набралось WAL_SNAPSHOT_EVERY
+        # записей, не ждёт ни среза таблиц, ни записи файла
+        self.snapshot_error: Optional[BaseException] = None
+        self._snapshot_due = threading.Event()
+        self._stopping = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flush", daemon=True)
+        self._flusher.start()
+        self._snapshotter = threading.Thread(
+            target=self._snapshot_loop, name="wal-snapshot", daemon=True
+        )
+        self._snapshotter.start()
+
+    def _recover(self) -> int:
+        # миллионы новых объектов подряд гоняют циклический GC впустую: циклов тут нет
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load(self.tables)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _load(self, tables: Dict[str, Table], limits: Optional[Dict[int, int]] = None) -> int:
+        """Снапшот + сегменты после него; limits — gen -> сколько байт сегмента читать."""
+        limits = limits or {}
+        snapshots = _generations(self.dir, _SNAPSHOT_RE)
+        base = snapshots[-1] if snapshots else 0
+        if snapshots:
+            state = loads((self.dir / _snapshot_name(base)).read_bytes())
+            for name, saved in state.items():
+                tables[name].restore(saved)
+        replayed = 0
+        with ExitStack() as stack:
+            for table in tables.values():
+                stack.enter_context(table.bulk_load())
+            for gen in _generations(self.dir, _SEGMENT_RE):
+                if gen >= base:
+                    path = self.dir / _segment_name(gen)
+                    replayed += _replay_segment(path, tables, limits.get(gen))
+        return replayed
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._buf and not self._closed:
+                    self._cond.wait()
+                if not self._buf:
+                    return
+                batch, self._buf = self._buf, []
+                upto, f = self._appended, self._file
+            try:
+                f.write(b"".join(batch))
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception as e:  # ENOSPC, EIO, ...: иначе ждущие commit() висят вечно
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                self._rollback()
+                return
+            with self._cond:
+                self._durable = upto
+                self._durable_bytes = f.tell()
+                self._cond.notify_all()
+
+    def _rollback(self) -> None:
+        """Убирает из таблиц записи, не пережившие fsync: пересобирает их с диска."""
+        with self._write_lock:
+            with self._cond:
+                self._buf.clear()
+                gen, size = self._gen, self._durable_bytes
+            path = self.dir / _segment_name(gen)
+            with suppress(OSError):
+                # чтобы после рестарта не воскресли записи, о которых клиенты получили ошибку
+                os.truncate(path, size)
+            fresh = {name: type(table)() for name, table in self.tables.items()}
+            self._load(fresh, {gen: size})
+            for name, table in fresh.items():
+                self.tables[name].restore(table.dump())
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise WalError("write-ahead log failed") from self._error
+
+    def _wait_durable(self, ticket: int) -> None:
+        with self._cond:
+            while self._durable < ticket:
+                self._check()
+                self._cond.wait()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._write_lock:
+            yield
+
+    def append(self, *record: Any) -> Tuple[Any, int]:
+        """
+        Применяет запись к таблицам и ставит её в буфер журнала; только внутри
+        writing(). Возвращает (результат, билет) — билет ждать через commit().
+        """
+        with self._cond:
+            self._check()
+        result = _apply(self.tables, list(record))
+        with self._cond:
+            self._buf.append(dumps(list(record)) + b"\n")
+            self._appended += 1
+            ticket = self._appended
+            self._cond.notify_all()
+        self._since_snapshot += 1
+        return result, ticket
+
+    def commit(self, ticket: int) -> None:
+        """
+        Ждёт fsync записи (вне writing(), чтобы записи других потоков шли той же
+        пачкой); WalError, если журнал упал до неё. Снапшот — только сигнал потоку.
+        Внутри deferred() не ждёт: билет запоминается до выхода из блока.
+        """
+        if getattr(self._local, "ticket", None) is not None:
+            self._local.ticket = max(self._local.ticket, ticket)
+            return
+        self._wait_durable(ticket)
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot_due.set()
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """
+        Записи потока внутри блока не ждут fsync по одной: на выходе — один
+        commit последнего билета, он покрывает и все предыдущие. Пачка из N
+        строк (/workouts:batch) стоит одного-двух fsync, а не N подряд.
+        """
+        if getattr(self._local, "ticket", None) is not None:
+            yield  # вложенный блок — коммитит внешний
+            return
+        self._local.ticket = 0
+        try:
+            yield
+        finally:
+            ticket, self._local.ticket = self._local.ticket, None
+            if ticket:
+                self.commit(ticket)
+
+    def _snapshot_loop(self) -> None:
+        while True:
+            self._snapshot_due.wait()
+            self._snapshot_due.clear()
+            if self._since_snapshot >= self.snapshot_every:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    # старые снапшот и сегменты целы, повтор — через snapshot_every
+                    # записей; но пока снапшоты падают, старые сегменты не удаляются:
+                    # журнал и время старта растут
+                    logger.exception("WAL snapshot failed, old segments are kept")
+                    self.snapshot_error = e
+                else:
+                    self.snapshot_error = None
+            if self._stopping:
+                return
+
+    def snapshot(self) -> None:
+        """
+        Новый сегмент + снапшот состояния на его начало; старые сегменты и
+        снапшоты после этого не нужны. Если снапшот уже пишется — пропуск.
+        """
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            self._snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def _snapshot(self) -> None:
+        with self._write_lock:
+            if self._since_snapshot == 0:
+                return
+            with self._cond:
+                ticket = self._appended
+            self._wait_durable(ticket)
+            gen = self._gen + 1
+            new_file = open(self.dir / _segment_name(gen), "ab")
+            with self._cond:
+                old_file, self._file, self._gen = self._file, new_file, gen
+                self._durable_bytes = 0
+            old_file.close()
+            # срез под замком записи — ровно состояние на начало сегмента gen;
+            # на диск он пишется уже без замка, записи идут в новый сегмент
+            state = dump_state(self.tables)
+            self._since_snapshot = 0
+        write_snapshot(self.dir, gen, state)
+        for old in _generations(self.dir, _SEGMENT_RE):
+            if old < gen:
+                (self.dir / _segment_name(old)).unlink(missing_ok=True)
+        for old in _generations(self.dir, _SNAPSHOT_RE):
+            if old < gen:
+                (self.dir / _snapshot_name(old)).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        # сначала снапшоты (им нужен живой flusher), затем flusher
+        self._stopping = True
+        self._snapshot_due.set()
+        self._snapshotter.join()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+
+class WalTable:
+    """RowStore поверх in-memory таблицы: чтения напрямую, записи — через журнал."""
+
+    def __init__(self, wal: WriteAheadLog, name: str) -> None:
+        self._wal = wal
+        self._name = name
+        self._table = wal.tables[name]
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __iter__(self) -> Iterator[Row]:
+        return iter(self._table)
+
+    def _write(self, *record: Any) -> Any:
+        with self._wal.writing():
+            result, ticket = self._wal.append(*record)
+        self._wal.commit(ticket)
+        return result
+
+    def insert(self, row: Row) -> Row:
+        return self._write("insert", self._name, row)
+
+    def get(self, row_id: int) -> Optional[Row]:
+        return self._table.get(row_id)
+
+    @property
+    def version(self) -> str:
+        return self._table.version
+
+    def row_version(self, row_id: int) -> Optional[str]:
+        return self._table.row_version(row_id)
+
+    def update(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Row]:
+        versioned = self.update_versioned(row_id, changes, if_match=if_match)
+        return None if versioned is None else versioned[0]
+
+    def update_versioned(
+        self, row_id: int, changes: Row, *, if_match: Optional[Container[str]] = None
+    ) -> Optional[Tuple[Row, str]]:
+        with self._wal.writing():
+            current = self._table.row_version(row_id)
+            if current is None:
+                return None
+            check_version(current, if_match)
+            result, ticket = self._wal.append("update", self._name, row_id, changes)
+            version = self._table.row_version(row_id)
+        self._wal.commit(ticket)
+        return result, version
+
+    def delete(self, row_id: int, *, if_match: Optional[Container[str]] = None) -> bool:
+        with self._wal.writing():
+            current = self._table.row_version(row_id)
+            if current is None:
+                return False
+            check_version(current, if_match)
+            result, ticket = self._wal.append("delete", self._name, row_id)
+        self._wal.commit(ticket)
+        return result
+
+    def clear(self) -> None:
+        self._write("clear", self._name)
+
+    def deferred(self) -> ContextManager[None]:
+        return self._wal.deferred()
+
+    def page(self, after: int = 0, limit: Optional[int] = None) -> List[Row]:
+        return self._table.page(after, limit)
+
+
+class WalWorkoutTable(WalTable):
+    _table: WorkoutTable
+
+    def range(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        after: Optional[DateKey] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]:
+        return self._table.range(date_from, date_to, after=after, limit=limit)
+
+    def day_totals(
+        self, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> List[DayTotal]:
+        return self._table.day_totals(date_from, date_to)
+
+
+def open_wal_db(directory: str, snapshot_every: int) -> Dict[str, Any]:
+    wal = WriteAheadLog(directory, {"items": Table(), "workouts": WorkoutTable()}, snapshot_every)
+    return {"items": WalTable(wal, "items"), "workouts": WalWorkoutTable(wal, "workouts")}
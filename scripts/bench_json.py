@@ -0,0 +1,64 @@
+"""
+Бенчмарк: стоимость сериализации списка тренировок.
+
+Сравниваем на списке из N строк (как отдаёт GET /workouts):
+- fastapi: путь по умолчанию — jsonable_encoder + JSONResponse (stdlib json);
+- stdlib: FastJSONResponse без orjson (fallback), мимо jsonable_encoder;
+- fast: FastJSONResponse как есть (orjson, если установлен).
+
+    python scripts/bench_json.py [N] [REPEAT]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.common import responses  # noqa: E402
+
+
+def _rows(n: int) -> list:
+    return [
+        {
+            "id": i,
+            "title": f"Тренировка {i % 50}",
+            "notes": None if i % 3 else "интервалы 4x400",
+            "duration_min": 30 + i % 60,
+            "date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _fastapi(rows: list) -> bytes:
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def _stdlib(rows: list) -> bytes:
+    return responses._stdlib_dumps(rows)
+
+
+def _fast(rows: list) -> bytes:
+    return responses.FastJSONResponse(rows).body
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = _rows(n)
+    print(f"orjson: {'yes' if responses.orjson is not None else 'no'}")
+    for name, fn in (("fastapi", _fastapi), ("stdlib", _stdlib), ("fast", _fast)):
+        fn(rows)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn(rows)
+        per_call = (time.perf_counter() - t0) / repeat
+        print(f"{name:8s} {n} rows: {per_call * 1000:7.2f} ms/response")
+
+
+if __name__ == "__main__":
+    main()
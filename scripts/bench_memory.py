@@ -0,0 +1,66 @@
+"""
+Бенчмарк: память на строку in-memory таблицы тренировок.
+
+Сравниваем на N строках (tracemalloc, байт/строка вместе с индексом дат):
+- dict: прежнее представление — dict на строку с ISO-датой и индекс
+  из кортежей (date, id);
+- compact: WorkoutTable — слотовые записи, ординал дня, интернированные
+  названия и int-ключи индекса.
+
+    python scripts/bench_memory.py [N]
+"""
+
+from bisect import insort
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import WorkoutTable  # noqa: E402
+
+
+def _payloads(n: int):
+    for i in range(1, n + 1):
+        # как из JSON-парсера: у каждой строки свои объекты str
+        yield {
+            "title": "".join(["Тренировка ", str(i % 50)]),
+            "notes": None if i % 3 else "".join(["интервалы ", str(i % 7)]),
+            "duration_min": 30 + i % 600,
+            "date": f"20{20 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        }
+
+
+def _dict_table(n: int) -> object:
+    rows, by_date = {}, []
+    for i, row in enumerate(_payloads(n), start=1):
+        rows[i] = {"id": i, **row}
+        insort(by_date, (row["date"], i))
+    return rows, by_date
+
+
+def _compact_table(n: int) -> object:
+    t = WorkoutTable()
+    for row in _payloads(n):
+        t.insert(row)
+    return t
+
+
+def measure(build, n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = build(n)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del table
+    return used / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for name, build in (("dict", _dict_table), ("compact", _compact_table)):
+        print(f"{name:8s} {n} rows: {measure(build, n):7.1f} bytes/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Микробенчмарк middleware-стека на GET /health.
+
+Сравнивает прежний стек (ProblemJSONMiddleware на BaseHTTPMiddleware +
+отдельный CorrelationIdMiddleware с uuid4) с текущей единой ASGI-прослойкой.
+Приложение вызывается напрямую через ASGI (без сети и HTTP-клиента),
+поэтому разница в req/s — это накладные расходы самих middleware.
+
+    python scripts/bench_middleware.py [N]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.middleware.correlation import (  # noqa: E402
+    HEADER,
+    CorrelationIdMiddleware,
+    _sanitize_correlation_id,
+)
+
+
+class LegacyProblemJSONMiddleware(BaseHTTPMiddleware):
+    """Реализация до перехода на ASGI — только для сравнения."""
+
+    async def dispatch(self, request: Request, call_next):
+        corr = request.headers.get("x-correlation-id") or str(uuid.uuid4())
+        try:
+            response: Response = await call_next(request)
+            response.headers["x-correlation-id"] = corr
+            return response
+        except Exception as e:
+            problem = {
+                "type": "about:blank",
+                "title": "Internal Server Error",
+                "status": 500,
+                "detail": "".join(traceback.format_exception(e)),
+                "correlation_id": corr,
+            }
+            return Response(
+                content=json.dumps(problem),
+                media_type="application/problem+json",
+                status_code=500,
+                headers={"x-correlation-id": corr},
+            )
+
+
+class LegacyCorrelationIdMiddleware:
+    """Отдельный correlation-слой со своим uuid4 — только для сравнения."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        raw = next((v for k, v in scope.get("headers") or [] if k.lower() == HEADER), None)
+        cid = _sanitize_correlation_id(raw.decode("ascii", "ignore")) if raw else str(uuid.uuid4())
+        scope.setdefault("state", {})["correlation_id"] = cid
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [(k, v) for (k, v) in message.get("headers") or [] if k != HEADER]
+                headers.append((HEADER, cid.encode("ascii")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def build_app(*middleware) -> FastAPI:
+    app = FastAPI()
+    for mw in middleware:
+        app.add_middleware(mw)
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    return app
+
+
+async def run(app: FastAPI, n: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/health",
+        "raw_path": b"/health",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(n, 200)):  # прогрев
+        await app(dict(scope), receive, send)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return n / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    legacy_app = build_app(LegacyProblemJSONMiddleware, LegacyCorrelationIdMiddleware)
+    legacy = asyncio.run(run(legacy_app, n))
+    current = asyncio.run(run(build_app(CorrelationIdMiddleware), n))
+    print(f"legacy (BaseHTTPMiddleware + correlation): {legacy:10.0f} req/s")
+    print(
+        f"single ASGI layer:                         {current:10.0f} req/s  (x{current / legacy:.2f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
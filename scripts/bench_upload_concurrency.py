@@ -0,0 +1,77 @@
+"""
+Бенчмарк: блокирует ли сохранение загрузок event loop.
+
+Параллельно запускаем N сохранений (медленный диск имитируется задержкой
+в os.fsync) и «пробник» — задачу, которая каждые 5 мс засыпает и меряет,
+насколько позже она проснулась. Сравниваем:
+- inline: secure_save_chunks прямо в корутине (как раньше в upload_image);
+- executor: secure_save_stream с I/O в выделенном пуле.
+
+    python scripts/bench_upload_concurrency.py [N] [FSYNC_MS]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common import upload  # noqa: E402
+
+PAYLOAD = upload.PNG + b"0" * 200_000
+
+
+async def _probe(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - t0 - 0.005)
+
+
+async def _inline(base_dir: str) -> None:
+    upload.secure_save_chunks(base_dir, [PAYLOAD])
+
+
+async def _executor(base_dir: str) -> None:
+    async def chunks():
+        yield PAYLOAD
+
+    await upload.secure_save_stream(base_dir, chunks())
+
+
+async def run(save, n: int, base_dir: str) -> tuple[float, float]:
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(_probe(stop, lags))
+    await asyncio.sleep(0.02)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(save(base_dir) for _ in range(n)))
+    total = time.perf_counter() - t0
+    stop.set()
+    await probe
+    return total, max(lags)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    fsync_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(fsync_ms / 1000)
+        real_fsync(fd)
+
+    os.fsync = slow_fsync
+    with tempfile.TemporaryDirectory() as d:
+        for name, save in (("inline", _inline), ("executor", _executor)):
+            total, lag = asyncio.run(run(save, n, d))
+            print(
+                f"{name:9s} {n} uploads: total {total * 1000:7.1f} ms, "
+                f"max event-loop stall {lag * 1000:7.1f} ms"
+            )
+    upload.shutdown_io_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк: время старта in-memory хранилища с WAL на N строках.
+
+Сравниваем восстановление:
+- wal-only: все N вставок воспроизводятся из сегмента журнала;
+- snapshot: снапшот на N строк + хвост журнала из TAIL записей.
+
+    python scripts/bench_wal_startup.py [N] [TAIL]
+"""
+
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common.responses import dumps  # noqa: E402
+from app.db import Table, WorkoutTable  # noqa: E402
+from app.storage import wal  # noqa: E402
+
+
+def _record(i: int) -> bytes:
+    row = {
+        "title": f"Тренировка {i % 50}",
+        "notes": None,
+        "duration_min": 30 + i % 60,
+        "date": f"20{20 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+    }
+    return dumps(["insert", "workouts", row]) + b"\n"
+
+
+def _write_segment(directory: Path, gen: int, start: int, count: int) -> None:
+    with open(directory / f"wal-{gen:08d}.log", "wb") as f:
+        for i in range(start, start + count):
+            f.write(_record(i))
+
+
+def _tables() -> dict:
+    return {"items": Table(), "workouts": WorkoutTable()}
+
+
+def _startup(directory: Path) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    log = wal.WriteAheadLog(str(directory), _tables(), snapshot_every=sys.maxsize)
+    elapsed = time.perf_counter() - t0
+    rows = len(log.tables["workouts"])
+    log.close()
+    return elapsed, rows
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    tail = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    with tempfile.TemporaryDirectory() as d1, tempfile.TemporaryDirectory() as d2:
+        wal_only, with_snapshot = Path(d1), Path(d2)
+        _write_segment(wal_only, 1, 0, n)
+
+        tables = _tables()
+        _write_segment(with_snapshot, 1, 0, n - tail)
+        with tables["workouts"].bulk_load():
+            wal._replay_segment(with_snapshot / "wal-00000001.log", tables)
+        (with_snapshot / "wal-00000001.log").unlink()
+        wal.write_snapshot(with_snapshot, 2, wal.dump_state(tables))
+        _write_segment(with_snapshot, 2, n - tail, tail)
+
+        for name, directory in (("wal-only", wal_only), ("snapshot", with_snapshot)):
+            elapsed, rows = _startup(directory)
+            print(f"{name:9s} {rows} rows restored: startup {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,22 @@
 import httpx
 import pytest
+import pytest_asyncio
 
+from app.common import http_client
 from app.main import create_app
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def _fresh_http_client():
+    """
+    Общий AsyncClient привязан к event loop теста — закрываем его после каждого теста;
+    бюджеты ретраев и circuit breaker-ы хостов тоже не должны переживать тест.
+    """
+    yield
+    await http_client.aclose_client()
+    http_client.reset_host_policies()
+
+
 @pytest.mark.asyncio
 async def test_health_ok():
     app = create_app()
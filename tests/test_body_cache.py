@@ -0,0 +1,64 @@
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.api.routes import workouts
+from app.common.body_cache import BodyCache
+from app.db import get_db
+from app.main import create_app
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    get_db()["workouts"].clear()
+    workouts.LIST_CACHE.clear()
+    yield
+    get_db()["workouts"].clear()
+
+
+@pytest_asyncio.fixture
+async def client():
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+def test_lru_limits_and_version_mismatch():
+    cache = BodyCache(max_entries=2, max_bytes=10)
+    cache.put("a", "v1", b"aaaa", {})
+    cache.put("b", "v1", b"bbbb", {})
+    assert cache.get("a", "v1") == (b"aaaa", {})
+    cache.put("c", "v1", b"cccc", {})  # вытесняет давнее b
+    assert cache.get("b", "v1") is None
+    cache.put("d", "v1", b"dddd", {})  # по байтам: a + c + d > 10
+    assert len(cache) == 2
+
+    assert cache.get("d", "v2") is None  # версия сменилась — запись выброшена
+    assert cache.get("d", "v1") is None
+    cache.put("big", "v1", b"x" * 11, {})
+    assert cache.get("big", "v1") is None
+    assert cache.stats() == {"entries": 1, "bytes": 4, "hits": 1, "misses": 4}
+
+
+@pytest.mark.asyncio
+async def test_list_served_from_cache_until_write(client):
+    for day in ("2025-09-01", "2025-09-02", "2025-09-03"):
+        await client.post("/workouts", json={"title": day, "date": day})
+    params = {"date_from": "2025-09-01", "limit": 2}
+
+    first = await client.get("/workouts", params=params)
+    second = await client.get("/workouts", params=params)
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+    assert second.headers["content-type"] == "application/json"
+    await client.get("/workouts", params={"limit": 2})  # другие параметры — свой ключ
+
+    stats = (await client.get("/metrics")).json()["workouts_list_cache"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+    wid = first.json()[0]["id"]
+    await client.patch(f"/workouts/{wid}", json={"title": "changed"})
+    r = await client.get("/workouts", params=params)
+    assert r.json()[0]["title"] == "changed"
+    assert workouts.LIST_CACHE.stats()["misses"] == 3
@@ -0,0 +1,127 @@
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.main import create_app
+from app.storage.log import open_log_db
+
+
+@pytest.fixture(params=["memory", "sqlite", "log", "wal"])
+def backend(request, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.db._DB", None)
+    monkeypatch.setenv("STORAGE_BACKEND", "memory" if request.param == "wal" else request.param)
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "app.log"))
+    monkeypatch.setenv("WAL_DIR", str(tmp_path / "wal") if request.param == "wal" else "")
+    return request.param
+
+
+@pytest_asyncio.fixture
+async def client(backend):
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_get_workout_304_until_row_changes(client):
+    wid = (await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})).json()["id"]
+    r = await client.get(f"/workouts/{wid}")
+    tag = r.headers["etag"]
+    assert r.status_code == 200 and tag.startswith('"')
+
+    for header in (tag, f"W/{tag}", f'"other", {tag}', "*"):
+        r = await client.get(f"/workouts/{wid}", headers={"If-None-Match": header})
+        assert r.status_code == 304
+        assert r.content == b"" and r.headers["etag"] == tag
+
+    # запись в другую строку версию этой не меняет
+    await client.post("/workouts", json={"title": "B", "date": "2025-09-03"})
+    r = await client.get(f"/workouts/{wid}", headers={"If-None-Match": tag})
+    assert r.status_code == 304
+
+    await client.patch(f"/workouts/{wid}", json={"notes": "n"})
+    r = await client.get(f"/workouts/{wid}", headers={"If-None-Match": tag})
+    assert r.status_code == 200
+    assert r.json()["notes"] == "n" and r.headers["etag"] != tag
+
+
+@pytest.mark.asyncio
+async def test_list_etag_changes_on_any_write(client):
+    await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})
+    await client.post("/items", params={"name": "x"})
+    tags = {}
+    for url in ("/workouts", "/items"):
+        r = await client.get(url, params={"limit": 1})
+        tags[url] = r.headers["etag"]
+        r = await client.get(url, params={"limit": 1}, headers={"If-None-Match": tags[url]})
+        assert r.status_code == 304
+
+    await client.post("/workouts", json={"title": "B", "date": "2025-09-01"})
+    r = await client.get(
+        "/workouts", params={"limit": 1}, headers={"If-None-Match": tags["/workouts"]}
+    )
+    assert r.status_code == 200
+    assert [w["title"] for w in r.json()] == ["B"] and "x-next-cursor" in r.headers
+    r = await client.get("/items", params={"limit": 1}, headers={"If-None-Match": tags["/items"]})
+    assert r.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_get_item_etag(client):
+    item_id = (await client.post("/items", params={"name": "x"})).json()["id"]
+    r = await client.get(f"/items/{item_id}")
+    r = await client.get(f"/items/{item_id}", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert (await client.get("/items/999", headers={"If-None-Match": "*"})).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_if_match_guards_patch_and_delete(client):
+    wid = (await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})).json()["id"]
+    tag = (await client.get(f"/workouts/{wid}")).headers["etag"]
+
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "1"}, headers={"If-Match": tag})
+    assert r.status_code == 200
+
+    # второй писатель с тем же (уже устаревшим) ETag не затирает первого
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "2"}, headers={"If-Match": tag})
+    assert r.status_code == 412
+    assert r.headers["content-type"].startswith("application/problem+json")
+    assert r.json()["error_code"] == "precondition_failed"
+    r = await client.delete(f"/workouts/{wid}", headers={"If-Match": tag})
+    assert r.status_code == 412
+
+    r = await client.get(f"/workouts/{wid}")
+    assert r.json()["notes"] == "1"
+    fresh = r.headers["etag"]
+    # If-Match сравнивается строго: слабый тег не подходит
+    r = await client.delete(f"/workouts/{wid}", headers={"If-Match": f"W/{fresh}"})
+    assert r.status_code == 412
+    r = await client.delete(f"/workouts/{wid}", headers={"If-Match": f'"stale", {fresh}'})
+    assert r.status_code == 204
+    r = await client.patch("/workouts/999", json={"notes": "x"}, headers={"If-Match": "*"})
+    assert r.status_code == 404
+
+
+async def test_patch_returns_new_etag(client):
+    wid = (await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})).json()["id"]
+    tag = (await client.get(f"/workouts/{wid}")).headers["etag"]
+
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "1"}, headers={"If-Match": tag})
+    assert r.status_code == 200
+    new = r.headers["etag"]
+    assert new != tag
+    assert (await client.get(f"/workouts/{wid}")).headers["etag"] == new
+    # следующий условный PATCH — сразу с тегом из ответа, без GET
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "2"}, headers={"If-Match": new})
+    assert r.status_code == 200
+    assert r.json()["notes"] == "2"
+
+
+def test_log_workers_agree_on_versions(tmp_path):
+    a, b = open_log_db(str(tmp_path / "app.log")), open_log_db(str(tmp_path / "app.log"))
+    w = a["workouts"].insert({"title": "A", "date": "2025-09-01"})
+    assert b["workouts"].row_version(w["id"]) == a["workouts"].row_version(w["id"])
+    b["workouts"].update(w["id"], {"notes": "n"}, if_match={a["workouts"].row_version(w["id"])})
+    assert a["workouts"].version == b["workouts"].version
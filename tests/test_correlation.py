@@ -84,3 +84,16 @@ async def test_response_has_single_correlation_id_header():
         r = await ac.get("/health")
     count = sum(1 for k, _ in r.headers.raw if k.lower() == b"x-correlation-id")
     assert count == 1
+
+
+@pytest.mark.asyncio
+async def test_generated_correlation_id_is_shared_by_header_and_problem_body():
+    app = create_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r1 = await ac.get("/items/999")
+        r2 = await ac.get("/items/999")
+    cid = r1.headers.get("x-correlation-id")
+    assert cid and UUID_RE.match(cid)
+    assert r1.json()["correlation_id"] == cid
+    assert r2.headers.get("x-correlation-id") != cid
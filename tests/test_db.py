@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+import pytest
+
+from app.db import Table, WorkoutTable
+
+
+def test_table_ids_are_monotonic_and_not_reused():
+    t = Table()
+    a = t.insert({"name": "a"})
+    b = t.insert({"name": "b"})
+    assert (a["id"], b["id"]) == (1, 2)
+
+    assert t.delete(b["id"]) is True
+    assert t.delete(b["id"]) is False
+    c = t.insert({"name": "c"})
+    assert c["id"] == 3
+    assert [r["name"] for r in t] == ["a", "c"]
+
+
+def test_table_get_update_and_clear():
+    t = Table()
+    row = t.insert({"name": "x"})
+    assert t.get(row["id"]) is row
+    assert t.update(row["id"], {"name": "y"})["name"] == "y"
+    assert t.update(999, {"name": "z"}) is None
+
+    t.clear()
+    assert len(t) == 0
+    assert t.get(row["id"]) is None
+    assert t.insert({"name": "again"})["id"] == 1
+
+
+def test_workout_table_stores_compact_records_and_returns_copies():
+    t = WorkoutTable()
+    a = t.insert({"title": "Run", "notes": None, "duration_min": 30, "date": "2025-09-02"})
+    b = t.insert({"title": "".join(["R", "un"]), "duration_min": 20, "date": "2025-09-01"})
+    assert a == {"id": 1, "title": "Run", "notes": None, "duration_min": 30, "date": "2025-09-02"}
+    assert not hasattr(t._rows[1], "__dict__")
+    assert t._rows[1].title is t._rows[2].title
+
+    a["title"] = "mutated"
+    assert t.get(1)["title"] == "Run"
+    assert [w["id"] for w in t.range()] == [b["id"], a["id"]]
+
+    t.update(b["id"], {"date": "2025-09-03", "notes": "n"})
+    assert [w["id"] for w in t.range("2025-09-02", "2025-09-03")] == [1, 2]
+    assert [w["id"] for w in t.range(after=("2025-09-02", 1))] == [2]
+    assert [w["id"] for w in t.page(after=1)] == [2]
+    assert t.delete(1) and [w["id"] for w in t] == [2]
+
+
+@pytest.fixture
+def _tiny_switch_interval():
+    # частое переключение потоков — гонки проявляются за доли секунды
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(old)
+
+
+@pytest.mark.usefixtures("_tiny_switch_interval")
+@pytest.mark.parametrize("table_cls", [Table, WorkoutTable])
+def test_parallel_creates_get_unique_ids_and_consistent_indexes(table_cls):
+    t = table_cls()
+    threads, per_thread = 16, 300
+
+    def worker(n: int) -> list:
+        ids = []
+        for i in range(per_thread):
+            row = t.insert({"name": "x", "title": "W", "duration_min": 1, "date": "2025-09-01"})
+            ids.append(row["id"])
+            if i % 3 == 0:
+                t.delete(row["id"])
+            elif i % 3 == 1:
+                t.update(row["id"], {"name": "y", "date": "2025-09-01"})
+            t.page(after=row["id"] - 50, limit=50)
+            if isinstance(t, WorkoutTable):
+                t.range(after=("2025-09-01", row["id"] - 50), limit=50)
+        return ids
+
+    with ThreadPoolExecutor(threads) as pool:
+        ids = [i for chunk in pool.map(worker, range(threads)) for i in chunk]
+
+    assert sorted(ids) == list(range(1, threads * per_thread + 1))
+    alive = threads * per_thread - threads * len(range(0, per_thread, 3))
+    assert len(t) == alive
+    if table_cls is WorkoutTable:
+        assert len(t.range()) == alive
+        assert t.day_totals() == [("2025-09-01", alive, alive)]
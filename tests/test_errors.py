@@ -79,3 +79,26 @@ async def test_validation_error(client):
     # наш request_validation_handler добавляет расширения
     assert body.get("error_code") == "validation_error"
     assert isinstance(body.get("errors", []), list)
+
+
+# ---------- Необработанные исключения -> 500 problem+json ----------
+@pytest.mark.asyncio
+async def test_unhandled_exception_becomes_problem_500(app, monkeypatch):
+    monkeypatch.setenv("APP_ENV", "production")
+
+    @app.get("/crash")
+    async def crash():
+        raise RuntimeError("secret internals")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", headers={"x-correlation-id": "cid-500"}
+    ) as ac:
+        r = await ac.get("/crash")
+    assert r.status_code == 500
+    assert r.headers["content-type"].startswith("application/problem+json")
+    assert r.headers["x-correlation-id"] == "cid-500"
+    body = r.json()
+    assert body["status"] == 500 and body["correlation_id"] == "cid-500"
+    assert body["detail"] is None
+    assert "secret" not in r.text
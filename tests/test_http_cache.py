@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.common.http_client import ResponseCache, get_with_policies
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=False)
+
+
+@pytest.mark.asyncio
+async def test_fresh_hit_then_revalidation_with_etag():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"cache-control": "max-age=60"})
+        return httpx.Response(
+            200, headers={"etag": '"v1"', "cache-control": "max-age=60"}, content=b"payload"
+        )
+
+    clock = _Clock()
+    cache = ResponseCache(clock=clock)
+    async with _client(handler) as client:
+        r1 = await get_with_policies("http://up.example/a", client=client, cache=cache)
+        r2 = await get_with_policies("http://up.example/a", client=client, cache=cache)
+        assert seen == [None]  # второй ответ из кеша
+        clock.now += 61
+        r3 = await get_with_policies("http://up.example/a", client=client, cache=cache)
+    assert seen == [None, '"v1"']
+    assert r1.content == r2.content == r3.content == b"payload"
+    assert r3.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_no_store_and_errors_are_not_cached():
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        if request.url.path == "/err":
+            return httpx.Response(500, headers={"cache-control": "max-age=60"})
+        return httpx.Response(200, headers={"cache-control": "no-store"}, content=b"x")
+
+    cache = ResponseCache()
+    async with _client(handler) as client:
+        for path in ("/a", "/a", "/err", "/err"):
+            await get_with_policies(f"http://up.example{path}", client=client, cache=cache)
+    assert calls["n"] == 4
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_by_entries_and_bytes():
+    def handler(request: httpx.Request) -> httpx.Response:
+        size = int(request.url.params.get("size", "10"))
+        return httpx.Response(200, headers={"cache-control": "max-age=60"}, content=b"x" * size)
+
+    cache = ResponseCache(max_entries=2, max_bytes=100)
+    async with _client(handler) as client:
+        for name in ("a", "b", "a", "c"):  # "a" свежее "b" -> вытесняется "b"
+            await get_with_policies(f"http://up.example/{name}", client=client, cache=cache)
+        assert len(cache) == 2
+        assert "http://up.example/b" not in cache._entries
+
+        await get_with_policies("http://up.example/big?size=95", client=client, cache=cache)
+        assert cache.size_bytes <= 100
+        assert list(cache._entries) == ["http://up.example/big?size=95"]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_callers():
+    calls = {"n": 0}
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        await release.wait()
+        return httpx.Response(
+            200, headers={"cache-control": "no-cache", "etag": '"e"'}, content=b"ok"
+        )
+
+    cache = ResponseCache()
+    async with _client(handler) as client:
+        tasks = [
+            asyncio.create_task(
+                get_with_policies("http://up.example/s", client=client, cache=cache)
+            )
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*tasks)
+    assert calls["n"] == 1
+    assert {r.content for r in results} == {b"ok"}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_leader_cancellation():
+    calls = {"n": 0}
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        await release.wait()
+        return httpx.Response(200, headers={"cache-control": "max-age=60"}, content=b"ok")
+
+    cache = ResponseCache()
+    async with _client(handler) as client:
+        leader, follower = (
+            asyncio.create_task(
+                get_with_policies("http://up.example/c", client=client, cache=cache)
+            )
+            for _ in range(2)
+        )
+        await asyncio.sleep(0.01)
+        leader.cancel()  # клиент лидера отключился
+        await asyncio.sleep(0.01)
+        release.set()
+        assert (await follower).content == b"ok"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert (
+            await get_with_policies("http://up.example/c", client=client, cache=cache)
+        ).content == b"ok"
+    assert calls["n"] == 1
@@ -26,3 +26,32 @@ async def test_retries_with_backoff(monkeypatch):
     r = await get_with_policies("http://example.com")
     assert r.status_code == 200
     assert attempts["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_between_calls_and_attempts(monkeypatch):
+    created = {"n": 0}
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(200)
+
+    transport = httpx.MockTransport(handler)
+    RealAsyncClient = httpx.AsyncClient
+
+    def _factory(*args, **kwargs):
+        created["n"] += 1
+        kwargs["transport"] = transport
+        return RealAsyncClient(*args, **kwargs)
+
+    monkeypatch.setattr("app.common.http_client.httpx.AsyncClient", _factory)
+    monkeypatch.setattr("app.settings.HTTP_BACKOFF_BASE", 0.0)
+
+    for _ in range(3):
+        r = await get_with_policies("http://example.com")
+        assert r.status_code == 200
+    assert calls["n"] == 4
+    assert created["n"] == 1
@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.common import http_client
+from app.common.http_client import CircuitBreaker, CircuitOpenError, get_with_policies
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+
+    async def fake_sleep(delay):
+        recorded.append(delay)
+
+    monkeypatch.setattr("app.common.http_client._sleep", fake_sleep)
+    return recorded
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=False)
+
+
+@pytest.mark.asyncio
+async def test_backoff_is_jittered_and_capped(monkeypatch, sleeps):
+    monkeypatch.setattr("app.settings.HTTP_MAX_RETRIES", 4)
+    monkeypatch.setattr("app.settings.HTTP_BACKOFF_BASE", 0.2)
+    monkeypatch.setattr("app.settings.HTTP_BACKOFF_MAX", 0.5)
+
+    def handler(request):
+        raise httpx.ConnectError("down", request=request)
+
+    async with _client(handler) as client:
+        with pytest.raises(httpx.ConnectError):
+            await get_with_policies("http://flaky.example/", client=client)
+    assert len(sleeps) == 4
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= min(0.5, 0.2 * 2**attempt)
+
+
+@pytest.mark.asyncio
+async def test_honors_retry_after_and_gives_up_when_too_long(monkeypatch, sleeps):
+    monkeypatch.setattr("app.settings.HTTP_RETRY_AFTER_MAX", 5.0)
+    answers = iter(
+        [
+            httpx.Response(503, headers={"Retry-After": "2"}),
+            httpx.Response(200),
+            httpx.Response(429, headers={"Retry-After": "120"}),
+        ]
+    )
+
+    async with _client(lambda request: next(answers)) as client:
+        r = await get_with_policies("http://busy.example/", client=client)
+        assert r.status_code == 200
+        assert sleeps == [2.0]
+        r = await get_with_policies("http://busy.example/", client=client)
+    assert r.status_code == 429  # ждать 120 с не будем — отдаём ответ
+    assert sleeps == [2.0]
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_limits_retries_per_host(monkeypatch, sleeps):
+    monkeypatch.setattr("app.settings.HTTP_RETRY_BUDGET_BURST", 1)
+    monkeypatch.setattr("app.settings.HTTP_RETRY_BUDGET_RATE", 0.0)
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        return httpx.Response(503)
+
+    async with _client(handler) as client:
+        for _ in range(3):
+            r = await get_with_policies("http://budget.example/", client=client)
+            assert r.status_code == 503
+    assert calls["n"] == 4  # 3 запроса + единственный ретрай из бюджета
+    assert len(sleeps) == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast(monkeypatch, sleeps):
+    monkeypatch.setattr("app.settings.HTTP_MAX_RETRIES", 0)
+    monkeypatch.setattr("app.settings.HTTP_CB_FAILURE_THRESHOLD", 2)
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        return httpx.Response(500)
+
+    async with _client(handler) as client:
+        for _ in range(2):
+            assert (
+                await get_with_policies("http://sick.example/", client=client)
+            ).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await get_with_policies("http://sick.example/", client=client)
+        # другой хост не затронут
+        assert (await get_with_policies("http://other.example/", client=client)).status_code == 500
+    assert calls["n"] == 3
+    assert http_client.host_policy("sick.example").breaker.state == "open"
+
+
+def test_circuit_breaker_half_open_probe():
+    now = {"t": 0.0}
+    cb = CircuitBreaker(threshold=1, reset_timeout=10, clock=lambda: now["t"])
+    cb.record_failure()
+    assert cb.state == "open" and not cb.allow()
+
+    now["t"] = 10.0
+    assert cb.state == "half-open" and cb.allow()
+    assert not cb.allow()  # пока проба в полёте, остальных не пускаем
+    cb.record_failure()  # проба неудачна — снова open
+    assert cb.state == "open" and not cb.allow()
+
+    now["t"] = 20.0
+    assert cb.allow() and not cb.allow()
+    # проба пропала без исхода — через reset_timeout выпускается следующая
+    now["t"] = 30.0
+    assert cb.allow() and not cb.allow()
+    cb.record_success()
+    assert cb.state == "closed" and cb.allow() and cb.allow()
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_one_probe_through(monkeypatch, sleeps):
+    monkeypatch.setattr("app.settings.HTTP_MAX_RETRIES", 0)
+    monkeypatch.setattr("app.settings.HTTP_CB_FAILURE_THRESHOLD", 1)
+    now = {"t": 0.0}
+    http_client.host_policy("probe.example").breaker._clock = lambda: now["t"]
+    calls = {"n": 0}
+
+    async def handler(request):
+        calls["n"] += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(500 if calls["n"] == 1 else 200)
+
+    async with _client(handler) as client:
+        await get_with_policies("http://probe.example/", client=client)
+        now["t"] = 1000.0
+        results = await asyncio.gather(
+            *(get_with_policies("http://probe.example/", client=client) for _ in range(20)),
+            return_exceptions=True,
+        )
+    assert calls["n"] == 2
+    assert sum(isinstance(r, CircuitOpenError) for r in results) == 19
+    assert http_client.host_policy("probe.example").breaker.state == "closed"
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.common.http_client import get_many
+
+
+@pytest.mark.asyncio
+async def test_get_many_bounds_concurrency_and_runs_in_parallel():
+    state = {"in_flight": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.05)
+        state["in_flight"] -= 1
+        return httpx.Response(200, text=request.url.path)
+
+    urls = [f"http://fan.example/{i}" for i in range(6)]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        t0 = time.perf_counter()
+        results = [r async for r in get_many(urls, concurrency=3, client=client)]
+        elapsed = time.perf_counter() - t0
+
+    assert state["peak"] == 3
+    assert sorted(r.response.text for r in results) == sorted(f"/{i}" for i in range(6))
+    assert elapsed < 0.25  # 2 волны по 50 мс, а не 6 последовательных
+
+
+@pytest.mark.asyncio
+async def test_get_many_yields_as_completed_with_per_url_errors():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.05 if request.url.path == "/slow" else 0)
+        return httpx.Response(200, text=request.url.path)
+
+    urls = ["http://fan.example/slow", "file:///etc/passwd", "http://fan.example/fast"]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        results = [r async for r in get_many(urls, client=client)]
+
+    assert results[-1].url == "http://fan.example/slow"
+    bad = next(r for r in results if r.url.startswith("file:"))
+    assert not bad.ok and isinstance(bad.error, ValueError)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [0, -1])
+async def test_get_many_rejects_non_positive_concurrency(concurrency):
+    with pytest.raises(ValueError):
+        async for _ in get_many(["http://fan.example/"], concurrency=concurrency):
+            pass
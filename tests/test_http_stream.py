@@ -0,0 +1,77 @@
+import httpx
+import pytest
+
+from app.common.http_client import ResponseTooLarge, stream_with_policies
+from app.common.upload import PNG, import_image_from_url
+
+
+class _Body(httpx.AsyncByteStream):
+    """Тело без Content-Length; считает, сколько чанков у него забрали."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pulled = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.pulled += 1
+            yield chunk
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=False)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_chunks_and_aborts_over_cap():
+    body = _Body([b"a" * 10] * 100)
+    async with _client(lambda request: httpx.Response(200, stream=body)) as client:
+        got = 0
+        with pytest.raises(ResponseTooLarge):
+            async for chunk in stream_with_policies(
+                "http://up.example/big", max_bytes=35, client=client
+            ):
+                got += len(chunk)
+    assert got <= 35
+    assert body.pulled < 10  # передачу оборвали, а не дочитали до конца
+
+
+@pytest.mark.asyncio
+async def test_stream_rejects_by_content_length_and_bad_status():
+    async with _client(lambda request: httpx.Response(200, content=b"x" * 100)) as client:
+        with pytest.raises(ResponseTooLarge):
+            async for _ in stream_with_policies("http://up.example/", max_bytes=50, client=client):
+                pytest.fail("body must not be read")
+
+    redirect = httpx.Response(302, headers={"Location": "https://evil.example/"})
+    async with _client(lambda request: redirect) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            async for _ in stream_with_policies("http://up.example/", client=client):
+                pass
+
+
+@pytest.mark.asyncio
+async def test_import_image_from_url_pipes_into_upload_storage(tmp_path, monkeypatch):
+    png = PNG + b"0" * 1000
+    transport = httpx.MockTransport(
+        lambda request: (
+            httpx.Response(200, stream=_Body([png[:5], png[5:]]))
+            if request.url.path == "/ok.png"
+            else httpx.Response(200, content=b"<html>")
+        )
+    )
+    RealAsyncClient = httpx.AsyncClient
+
+    def _factory(*args, **kwargs):
+        kwargs["transport"] = transport
+        return RealAsyncClient(*args, **kwargs)
+
+    monkeypatch.setattr("app.common.http_client.httpx.AsyncClient", _factory)
+
+    ok, stored = await import_image_from_url(str(tmp_path), "http://img.example/ok.png")
+    assert ok, stored
+    assert (tmp_path / stored.split("/")[-1]).read_bytes() == png
+
+    ok, reason = await import_image_from_url(str(tmp_path), "http://img.example/page")
+    assert (ok, reason) == (False, "bad_type")
+    assert len(list(tmp_path.iterdir())) == 1
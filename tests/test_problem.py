@@ -0,0 +1,54 @@
+import json
+
+import httpx
+import pytest
+
+from app.common import problem as problems
+from app.common.problem import PROBLEM_TYPES, ProblemType, problem
+from app.main import create_app
+
+
+def test_problem_type_render_matches_dynamic_problem():
+    ptype = ProblemType(
+        "test.sample",
+        422,
+        "Unprocessable Entity",
+        "Request validation failed",
+        code="validation_error",
+        errors=[{"loc": "body.x", "msg": "required", "type": "missing"}],
+    )
+    dynamic = problem(
+        status=422,
+        title="Unprocessable Entity",
+        detail="Request validation failed",
+        extras=ptype.extras,
+        correlation_id="cid-1",
+    )
+    assert json.loads(ptype.render("cid-1")) == json.loads(dynamic.body)
+    assert json.loads(ptype.render(None))["correlation_id"] is None
+    assert ptype.payload("cid-2") == json.loads(ptype.render("cid-2"))
+
+
+def test_registry_rejects_duplicate_names():
+    assert PROBLEM_TYPES["workouts.not_found"].status == 404
+    with pytest.raises(ValueError):
+        problems.not_found("workouts.not_found", "again")
+
+
+@pytest.mark.asyncio
+async def test_registered_404_is_served_as_problem_json():
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", headers={"x-correlation-id": "cid-404"}
+    ) as ac:
+        r = await ac.get("/workouts/424242")
+    assert r.status_code == 404
+    assert r.headers["content-type"] == "application/problem+json"
+    assert r.json() == {
+        "type": "about:blank",
+        "title": "Not Found",
+        "status": 404,
+        "detail": "Workout not found",
+        "error_code": "not_found",
+        "correlation_id": "cid-404",
+    }
@@ -0,0 +1,29 @@
+import datetime as dt
+import json
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.common import responses
+from app.main import create_app
+
+
+@pytest.mark.parametrize("dumps", [responses._stdlib_dumps, responses.dumps])
+def test_dumps_compact_utf8_and_dates(dumps):
+    data = [{"id": 1, "title": "Бег", "date": dt.date(2025, 1, 2), "notes": None}]
+    body = dumps(data)
+    assert body == '[{"id":1,"title":"Бег","date":"2025-01-02","notes":null}]'.encode("utf-8")
+
+
+def test_stdlib_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        responses._stdlib_dumps({"x": object()})
+
+
+def test_app_responses_use_fast_json():
+    client = TestClient(create_app())
+    r = client.post("/workouts", json={"title": "Плавание", "date": "2025-03-04"})
+    assert r.status_code == 201
+    assert r.headers["content-type"] == "application/json"
+    assert "Плавание".encode("utf-8") in r.content
+    assert json.loads(client.get("/workouts").content)[-1]["title"] == "Плавание"
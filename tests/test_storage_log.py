@@ -0,0 +1,127 @@
+import json
+import multiprocessing
+import os
+import struct
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.main import create_app
+from app.storage.log import open_log_db
+
+
+@pytest.fixture
+def log_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "log")
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "app.log"))
+    monkeypatch.setattr("app.db._DB", None)
+    return str(tmp_path / "app.log")
+
+
+@pytest_asyncio.fixture
+async def client(log_env):
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_workouts_crud_on_log_backend(client):
+    r = await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})
+    assert r.status_code == 201
+    wid = r.json()["id"]
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "n"})
+    assert r.json()["notes"] == "n"
+    assert (await client.get("/workouts/stats")).json()[0]["count"] == 1
+    assert (await client.delete(f"/workouts/{wid}")).status_code == 204
+    assert (await client.get(f"/workouts/{wid}")).status_code == 404
+
+
+def test_two_handles_see_each_others_writes_and_share_ids(log_env):
+    a, b = open_log_db(log_env), open_log_db(log_env)
+    w1 = a["workouts"].insert({"title": "A", "duration_min": 10, "date": "2025-09-01"})
+    w2 = b["workouts"].insert({"title": "B", "duration_min": 20, "date": "2025-09-01"})
+    assert (w1["id"], w2["id"]) == (1, 2)
+    assert a["workouts"].get(2)["title"] == "B"
+
+    b["workouts"].update(1, {"date": "2025-09-03"})
+    assert a["workouts"].delete(2) is True
+    assert b["workouts"].delete(2) is False
+    assert [w["id"] for w in b["workouts"].range("2025-09-02")] == [1]
+    assert a["workouts"].day_totals() == [("2025-09-03", 1, 10)]
+
+    reopened = open_log_db(log_env)
+    assert list(reopened["workouts"]) == list(a["workouts"])
+    assert reopened["items"].insert({"name": "x"})["id"] == 1
+
+
+def test_log_grows_past_initial_mapping(log_env):
+    a, b = open_log_db(log_env), open_log_db(log_env)
+    for i in range(5000):
+        a["items"].insert({"name": f"item-{i:04d}-" + "x" * 200})
+    assert len(b["items"]) == 5000
+    assert b["items"].get(5000)["name"].startswith("item-4999")
+
+
+def test_compaction_keeps_rows_versions_and_other_handles_in_step(log_env):
+    a, b = open_log_db(log_env, compact_min_bytes=64 * 1024), open_log_db(log_env)
+    w = a["workouts"].insert({"title": "A", "duration_min": 10, "date": "2025-09-01"})
+    gone = a["items"].insert({"name": "gone"})
+    a["items"].delete(gone["id"])
+    for i in range(3000):  # история обновлений одной строки — ~200KB лога
+        a["workouts"].update(w["id"], {"notes": f"n{i}"})
+    log = a["workouts"]._log
+    assert log._committed() < 64 * 1024  # лог ужат до живых строк
+    inode = os.stat(log_env).st_ino
+
+    # b открыт до компакций: переоткрывает файл и видит то же, что a
+    assert b["workouts"].get(w["id"])["notes"] == "n2999"
+    assert b["workouts"].row_version(w["id"]) == a["workouts"].row_version(w["id"])
+    assert b["workouts"].version == a["workouts"].version
+    assert b["items"].insert({"name": "x"})["id"] == gone["id"] + 1  # id не переиспользуются
+    assert a["items"].get(gone["id"] + 1)["name"] == "x"
+    assert a["workouts"].day_totals() == [("2025-09-01", 1, 10)]
+    assert os.stat(log_env).st_ino == inode
+
+    reopened = open_log_db(log_env)
+    assert list(reopened["workouts"]) == list(a["workouts"])
+    assert reopened["workouts"].version == a["workouts"].version
+
+
+def test_previous_format_file_is_upgraded_on_open(log_env):
+    records = [["insert", "items", {"name": "a"}], ["insert", "items", {"name": "b"}]]
+    records.append(["delete", "items", 1])
+    body = b"".join(
+        struct.pack("<I", len(r)) + r for r in map(str.encode, map(json.dumps, records))
+    )
+    with open(log_env, "wb") as f:
+        f.write(struct.pack("<8sQ8s", b"SECDLOG2", 24 + len(body), b"0badcafe") + body)
+        f.truncate(1 << 20)
+
+    db = open_log_db(log_env)
+    assert list(db["items"]) == [{"id": 2, "name": "b"}]
+    assert db["items"].version.startswith("0badcafe.")
+    assert db["items"].insert({"name": "c"})["id"] == 3
+    with open(log_env, "rb") as f:
+        assert f.read(8) == b"SECDLOG3"
+    assert [i["name"] for i in open_log_db(log_env)["items"]] == ["b", "c"]
+
+
+def _insert_many(path: str, n: int) -> None:
+    db = open_log_db(path, compact_min_bytes=4096)
+    for _ in range(n):
+        db["items"].insert({"name": "p"})
+
+
+def test_parallel_processes_append_without_duplicate_ids(log_env):
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_insert_many, args=(log_env, 200)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+
+    ids = [row["id"] for row in open_log_db(log_env)["items"]]
+    assert ids == list(range(1, 601))
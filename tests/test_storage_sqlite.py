@@ -0,0 +1,221 @@
+import functools
+import sqlite3
+import threading
+import time
+
+from fastapi.testclient import TestClient
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.db import WorkoutTable, get_db
+from app.main import create_app
+from app.storage.sqlite import ConnectionPool, open_sqlite_db
+
+
+@pytest.fixture
+def sqlite_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr("app.db._DB", None)
+    return tmp_path / "app.db"
+
+
+@pytest_asyncio.fixture
+async def client(sqlite_env):
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_workouts_crud_on_sqlite_backend(client):
+    r = await client.post(
+        "/workouts", json={"title": "A", "date": "2025-09-02", "duration_min": 30}
+    )
+    assert r.status_code == 201
+    wid = r.json()["id"]
+    await client.post("/workouts", json={"title": "B", "date": "2025-09-01"})
+
+    r = await client.patch(f"/workouts/{wid}", json={"notes": "n", "junk": "x"})
+    assert r.status_code == 200
+    assert r.json()["notes"] == "n" and "junk" not in r.json()
+
+    r = await client.get("/workouts", params={"limit": 1})
+    assert [w["title"] for w in r.json()] == ["B"]
+    r = await client.get("/workouts", params={"limit": 1, "cursor": r.headers["x-next-cursor"]})
+    assert [w["title"] for w in r.json()] == ["A"]
+
+    assert (await client.delete(f"/workouts/{wid}")).status_code == 204
+    assert (await client.get(f"/workouts/{wid}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_ids_beyond_sqlite_integer_are_rejected_not_500(client):
+    huge = 10**23  # sqlite3 на таком int бросает OverflowError
+    await client.post("/workouts", json={"title": "A", "date": "2025-09-01"})
+    for method in ("GET", "PATCH", "DELETE"):
+        r = await client.request(method, f"/workouts/{huge}", json={})
+        assert r.status_code == 422, (method, r.text)
+        assert r.headers["content-type"].startswith("application/problem+json")
+    assert (await client.get(f"/items/{huge}")).status_code == 422
+    assert (await client.get("/workouts/0")).status_code == 422
+
+    r = await client.request("PATCH", "/workouts:batch", json=[{"id": huge, "notes": "n"}])
+    assert r.json()["results"][0]["status"] == 404
+    r = await client.request("DELETE", "/workouts:batch", json=[huge, 1])
+    assert [x["status"] for x in r.json()["results"]] == [404, 204]
+
+
+def test_sqlite_data_survives_reopen_and_ids_not_reused(sqlite_env):
+    db = open_sqlite_db(str(sqlite_env))
+    a = db["workouts"].insert({"title": "A", "date": "2025-09-01", "duration_min": 10})
+    db["workouts"].insert({"title": "B", "date": "2025-09-03", "duration_min": 20})
+    db["workouts"].delete(a["id"] + 1)
+
+    reopened = open_sqlite_db(str(sqlite_env))
+    assert reopened["workouts"].get(a["id"])["title"] == "A"
+    assert reopened["workouts"].insert({"title": "C", "date": "2025-09-02"})["id"] == 3
+    assert [w["title"] for w in reopened["workouts"].range("2025-09-01", "2025-09-02")] == [
+        "A",
+        "C",
+    ]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_day_totals_follow_insert_update_delete(backend, sqlite_env):
+    table = WorkoutTable() if backend == "memory" else open_sqlite_db(str(sqlite_env))["workouts"]
+    a = table.insert({"title": "A", "date": "2025-09-01", "duration_min": 10})
+    table.insert({"title": "B", "date": "2025-09-01", "duration_min": 20})
+    c = table.insert({"title": "C", "date": "2025-09-03", "duration_min": 5})
+    assert table.day_totals() == [("2025-09-01", 2, 30), ("2025-09-03", 1, 5)]
+
+    table.update(a["id"], {"date": "2025-09-03", "duration_min": 15})
+    table.delete(c["id"])
+    assert table.day_totals() == [("2025-09-01", 1, 20), ("2025-09-03", 1, 15)]
+    assert table.day_totals("2025-09-02", "2025-09-30") == [("2025-09-03", 1, 15)]
+    table.clear()
+    assert table.day_totals() == []
+
+
+def test_sqlite_day_totals_backfilled_for_existing_file(sqlite_env):
+    db = open_sqlite_db(str(sqlite_env))
+    db["workouts"].insert({"title": "A", "date": "2025-09-01", "duration_min": 10})
+    with sqlite3.connect(sqlite_env) as conn:
+        conn.execute("DELETE FROM workout_days")
+
+    assert open_sqlite_db(str(sqlite_env))["workouts"].day_totals() == [("2025-09-01", 1, 10)]
+
+
+def test_pool_bounds_connections_across_short_lived_threads(sqlite_env, monkeypatch):
+    opened = []
+    open_conn = ConnectionPool._open
+
+    def counting_open(pool):
+        opened.append(open_conn(pool))
+        return opened[-1]
+
+    monkeypatch.setattr(ConnectionPool, "_open", counting_open)
+    table = open_sqlite_db(str(sqlite_env), pool_size=2)["workouts"]
+    # волны новых потоков — как anyio, заменивший простоявшие воркеры
+    for _ in range(3):
+        threads = [
+            threading.Thread(target=table.insert, args=({"title": "A", "date": "2025-09-01"},))
+            for _ in range(10)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(table) == 30
+    assert len(opened) <= 2
+
+    table.close()
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    with pytest.raises(sqlite3.ProgrammingError):
+        table.get(1)
+
+
+def test_lifespan_closes_sqlite_pool(sqlite_env):
+    with TestClient(create_app()) as client:
+        assert (
+            client.post("/workouts", json={"title": "A", "date": "2025-09-01"}).status_code == 201
+        )
+        table = get_db()["workouts"]
+    with pytest.raises(sqlite3.ProgrammingError):
+        table.get(1)
+    assert get_db()["workouts"].get(1)["title"] == "A"  # открывается заново
+
+
+def _open_while_locked(path, n=2):
+    """
+    n одновременных open_sqlite_db, пока чужая транзакция держит замок записи:
+    все стартуют до его снятия, как воркеры uvicorn на одном файле.
+    """
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    errors = []
+
+    def opener():
+        try:
+            open_sqlite_db(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=opener) for _ in range(n)]
+    for t in threads:
+        t.start()
+    time.sleep(0.3)
+    holder.execute("COMMIT")
+    holder.close()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_sqlite_backfill_survives_concurrent_startup(sqlite_env):
+    db = open_sqlite_db(str(sqlite_env))
+    for day in ("2025-09-01", "2025-09-02", "2025-09-02"):
+        db["workouts"].insert({"title": "A", "date": day, "duration_min": 10})
+    with sqlite3.connect(sqlite_env) as conn:
+        conn.execute("DELETE FROM workout_days")
+
+    # итоги пересчитывает ровно один из стартующих разом
+    assert _open_while_locked(str(sqlite_env)) == []
+    assert db["workouts"].day_totals() == [("2025-09-01", 1, 10), ("2025-09-02", 2, 20)]
+
+
+class _SlowAlter(sqlite3.Connection):
+    """Расширяет окно между проверкой колонок и ALTER TABLE, где и была гонка."""
+
+    def execute(self, sql, *args):
+        if sql.startswith("ALTER TABLE"):
+            time.sleep(0.2)
+        return super().execute(sql, *args)
+
+
+def test_sqlite_version_column_added_once_on_concurrent_startup(sqlite_env, monkeypatch):
+    # файл до появления версий: строк версий и колонки version ещё нет
+    conn = sqlite3.connect(str(sqlite_env))
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL);
+        CREATE TABLE workouts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, notes TEXT,
+            duration_min INTEGER, date TEXT NOT NULL
+        );
+        INSERT INTO workouts (title, date) VALUES ('A', '2025-09-01');
+        """
+    )
+    conn.close()
+
+    with monkeypatch.context() as m:
+        m.setattr(sqlite3, "connect", functools.partial(sqlite3.connect, factory=_SlowAlter))
+        assert _open_while_locked(str(sqlite_env), n=3) == []
+    table = open_sqlite_db(str(sqlite_env))["workouts"]
+    tag = table.row_version(1)
+    assert table.update(1, {"notes": "n"}, if_match={tag})["notes"] == "n"
+    assert table.row_version(1) != tag
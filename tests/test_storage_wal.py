@@ -0,0 +1,183 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.main import create_app
+from app.storage import wal as wal_module
+from app.storage.wal import WalError, open_wal_db
+
+
+@pytest.fixture
+def wal_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setenv("WAL_DIR", str(tmp_path / "wal"))
+    monkeypatch.setattr("app.db._DB", None)
+    return str(tmp_path / "wal")
+
+
+def _open(path: str, snapshot_every: int = 1000):
+    db = open_wal_db(path, snapshot_every)
+    return db, db["items"]._wal
+
+
+@pytest_asyncio.fixture
+async def client(wal_env):
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_routes_write_through_wal(client, wal_env):
+    wid = (await client.post("/workouts", json={"title": "A", "date": "2025-09-02"})).json()["id"]
+    await client.patch(f"/workouts/{wid}", json={"notes": "n"})
+    await client.post("/items", params={"name": "x"})
+
+    db, wal = _open(wal_env)
+    assert db["workouts"].get(wid)["notes"] == "n"
+    assert db["items"].get(1)["name"] == "x"
+    wal.close()
+
+
+def test_restart_replays_snapshot_and_tail(wal_env):
+    db, wal = _open(wal_env, snapshot_every=3)
+    for d in ("2025-09-03", "2025-09-01", "2025-09-02", "2025-09-04"):
+        db["workouts"].insert({"title": "W", "duration_min": 10, "date": d})
+    db["workouts"].update(2, {"date": "2025-09-05"})
+    db["workouts"].delete(1)
+    db["items"].insert({"name": "x"})
+    expected = list(db["workouts"])
+    wal.close()
+
+    names = sorted(os.listdir(wal_env))
+    assert len([n for n in names if n.startswith("snapshot-")]) == 1
+    # оборванная при падении запись в хвосте игнорируется
+    with open(os.path.join(wal_env, [n for n in names if n.startswith("wal-")][-1]), "ab") as f:
+        f.write(b'["insert","items",{"na')
+
+    db, wal = _open(wal_env)
+    assert list(db["workouts"]) == expected
+    assert [w["id"] for w in db["workouts"].range()] == [3, 4, 2]
+    assert db["workouts"].day_totals("2025-09-05") == [("2025-09-05", 1, 10)]
+    assert db["items"].insert({"name": "y"})["id"] == 2
+    wal.close()
+
+
+def test_group_commit_batches_concurrent_writes(wal_env, monkeypatch):
+    db, wal = _open(wal_env)
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        if threading.current_thread().name == "wal-flush":
+            fsyncs.append(fd)
+            time.sleep(0.01)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    with ThreadPoolExecutor(16) as pool:
+        ids = list(pool.map(lambda i: db["items"].insert({"name": str(i)})["id"], range(160)))
+    wal.close()
+
+    assert sorted(ids) == list(range(1, 161))
+    assert len(fsyncs) < 40
+
+
+@pytest.mark.asyncio
+async def test_batch_rows_share_fsyncs(client, wal_env, monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def counting_fsync(fd):
+        if threading.current_thread().name == "wal-flush":
+            fsyncs.append(fd)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", counting_fsync)
+    rows = [{"title": f"W{i}", "date": "2025-09-01"} for i in range(50)]
+    r = await client.post("/workouts:batch", json=rows)
+    assert [x["status"] for x in r.json()["results"]] == [201] * 50
+    r = await client.request("DELETE", "/workouts:batch", json=list(range(1, 51)))
+    assert [x["status"] for x in r.json()["results"]] == [204] * 50
+    # ответ уходит после fsync пачки: строки пережили бы рестарт
+    assert len(fsyncs) <= 6
+
+    monkeypatch.setattr(os, "fsync", real_fsync)
+    wid = (await client.post("/workouts", json=rows[0])).json()["id"]
+    db, wal = _open(wal_env)
+    assert [w["id"] for w in db["workouts"]] == [wid]
+    wal.close()
+
+
+def test_failed_fsync_fails_writers_and_rolls_back(wal_env, monkeypatch):
+    db, wal = _open(wal_env)
+    db["items"].insert({"name": "durable"})
+    real_fsync = os.fsync
+
+    def broken_fsync(fd):
+        if threading.current_thread().name == "wal-flush":
+            raise OSError(28, "No space left on device")
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", broken_fsync)
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(db["items"].insert, {"name": "lost"})
+        with pytest.raises(WalError):
+            future.result(timeout=3)
+    wal._flusher.join(timeout=3)
+    # неподтверждённая строка не видна читателям, новые записи отклоняются
+    assert db["items"].get(2) is None
+    assert [r["name"] for r in db["items"]] == ["durable"]
+    with pytest.raises(WalError):
+        db["workouts"].insert({"title": "W", "date": "2025-09-01"})
+    monkeypatch.setattr(os, "fsync", real_fsync)
+    wal.close()
+
+    db, wal = _open(wal_env)
+    assert [r["name"] for r in db["items"]] == ["durable"]
+    assert db["items"].insert({"name": "next"})["id"] == 2
+    wal.close()
+
+
+def test_snapshot_runs_off_the_request_thread(wal_env, monkeypatch):
+    db, wal = _open(wal_env, snapshot_every=2)
+    threads = []
+    real_write = wal_module.write_snapshot
+
+    def spy(*args):
+        threads.append(threading.current_thread().name)
+        real_write(*args)
+
+    monkeypatch.setattr(wal_module, "write_snapshot", spy)
+    for i in range(4):
+        db["items"].insert({"name": str(i)})
+    wal.close()
+    assert threads and set(threads) == {"wal-snapshot"}
+
+
+def test_failed_snapshot_is_logged_and_retried(wal_env, monkeypatch, caplog):
+    db, wal = _open(wal_env, snapshot_every=2)
+
+    def broken(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(wal_module, "write_snapshot", broken)
+    for i in range(3):
+        db["items"].insert({"name": str(i)})
+    deadline = time.monotonic() + 3
+    while wal.snapshot_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert isinstance(wal.snapshot_error, OSError)
+    assert "WAL snapshot failed" in caplog.text
+
+    monkeypatch.undo()
+    for i in range(4):
+        db["items"].insert({"name": str(i)})
+    wal.close()
+    assert wal.snapshot_error is None
+    assert any(n.startswith("snapshot-") for n in os.listdir(wal_env))
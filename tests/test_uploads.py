@@ -1,7 +1,11 @@
+import asyncio
+import time
+
 import httpx
 import pytest
 
-from app.common.upload import MAX_BYTES
+from app.common import upload
+from app.common.upload import MAX_BYTES, secure_save_chunks
 from app.main import create_app
 
 PNG_HEADER = b"\x89PNG\r\n\x1a\n"
@@ -94,3 +98,128 @@ async def test_accepts_exactly_max_size_png(tmp_path, monkeypatch):
     stored = r.json().get("stored_as")
     assert stored
     assert (tmp_path / stored.split("/")[-1]).exists()
+
+
+def test_secure_save_chunks_rejects_early_and_leaves_no_partial_file(tmp_path):
+    consumed = []
+
+    def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield PNG_HEADER + b"0" * (MAX_BYTES // 4) if i == 0 else b"0" * (MAX_BYTES // 4)
+
+    ok, reason = secure_save_chunks(str(tmp_path), chunks())
+    assert (ok, reason) == (False, "too_big")
+    assert len(consumed) == 4  # дальше превышения лимита не читаем
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_waits_for_inflight_write_before_abort(tmp_path, monkeypatch):
+    write = upload.ImageSink.write
+
+    def slow_write(sink, chunk):
+        time.sleep(0.2)  # отмена прилетает, пока поток пула ещё внутри write/_open
+        write(sink, chunk)
+
+    monkeypatch.setattr(upload.ImageSink, "write", slow_write)
+
+    async def chunks():
+        yield VALID_PNG
+        await asyncio.Event().wait()
+
+    task = asyncio.create_task(upload.secure_save_stream(str(tmp_path), chunks()))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    upload.shutdown_io_executor()  # дождаться всех заданий пула
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_secure_save_chunks_sniffs_type_split_across_chunks(tmp_path):
+    ok, stored = secure_save_chunks(str(tmp_path), [PNG_HEADER[:3], PNG_HEADER[3:], b"0" * 10])
+    assert ok, stored
+    assert (tmp_path / stored.split("/")[-1]).read_bytes() == VALID_PNG[:18]
+
+    ok, reason = secure_save_chunks(str(tmp_path), [b"not", b"-an-image"])
+    assert (ok, reason) == (False, "bad_type")
+
+    ok, reason = secure_save_chunks(str(tmp_path), [JPEG_SOI + b"0" * 64, b"0" * 64])
+    assert (ok, reason) == (False, "bad_type")
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def _multipart(chunks, consumed, head=PNG_HEADER):
+    boundary = "b0undary"
+
+    async def body():
+        yield (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="big.png"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode() + head
+        for i in range(chunks):
+            consumed.append(i)
+            yield b"0" * (1024 * 1024)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    return body(), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("declare_length", [True, False])
+async def test_oversized_body_rejected_before_form_is_spooled(
+    tmp_path, monkeypatch, declare_length
+):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    consumed = []
+    body, headers = _multipart(64, consumed)
+    if declare_length:
+        headers["Content-Length"] = str(64 * 1024 * 1024)
+
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post("/upload/image", content=body, headers=headers)
+
+    assert r.status_code == 400, r.text
+    assert r.json()["detail"] == "File too large"
+    # по Content-Length — не читая тела; без него — не дальше лимита
+    assert len(consumed) == (0 if declare_length else MAX_BYTES // (1024 * 1024) + 1)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_bad_type_rejected_from_first_bytes_of_body(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    consumed = []
+    body, headers = _multipart(4, consumed, head=b"MZ\x90\x00not-an-image")
+
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post("/upload/image", content=body, headers=headers)
+
+    assert r.status_code == 400, r.text
+    assert r.json()["detail"] == "Unsupported file type"
+    assert consumed == []  # тело дальше первого куска не читалось
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_file_field_found_among_other_form_fields(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post(
+            "/upload/image",
+            data={"note": "x" * 1000},
+            files={"file": ("ok.png", VALID_PNG, "image/png")},
+        )
+        assert r.status_code == 200, r.text
+        assert (tmp_path / r.json()["stored_as"].split("/")[-1]).read_bytes() == VALID_PNG
+
+        r = await ac.post("/upload/image", files={"other": ("ok.png", VALID_PNG, "image/png")})
+        assert r.status_code == 422
+        assert r.json()["errors"][0]["loc"] == "body.file"
+        r = await ac.post("/upload/image", json={"file": "x"})
+        assert r.status_code == 400
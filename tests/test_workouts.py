@@ -1,8 +1,11 @@
+import json
+
 import httpx
 import pytest
 import pytest_asyncio
 
-from app.db import get_db
+from app.common.pagination import encode_cursor
+from app.db import ROW_ID_LIMIT, get_db
 from app.main import create_app
 
 
@@ -113,3 +116,176 @@ async def test_delete_workout_204_then_404(client):
     # то проверим расширение:
     if "error_code" in body:
         assert body["error_code"] == "not_found"
+
+
+@pytest.mark.asyncio
+async def test_list_workouts_follows_date_changes_and_deletes(client):
+    ids = {}
+    for title, d in [("A", "2025-09-01"), ("B", "2025-09-10"), ("C", "2025-09-20")]:
+        ids[title] = (await client.post("/workouts", json={"title": title, "date": d})).json()["id"]
+
+    # переносим A внутрь диапазона, удаляем B
+    r = await client.patch(f"/workouts/{ids['A']}", json={"date": "2025-09-15"})
+    assert r.status_code == 200
+    await client.delete(f"/workouts/{ids['B']}")
+
+    r = await client.get("/workouts", params={"date_from": "2025-09-05", "date_to": "2025-09-20"})
+    assert [w["title"] for w in r.json()] == ["A", "C"]
+    r = await client.get("/workouts", params={"date_to": "2025-09-01"})
+    assert r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_create_rejects_non_iso_date(client):
+    r = await client.post("/workouts", json={"title": "X", "date": "01.09.2025"})
+    assert r.status_code == 422
+    body = r.json()
+    await _assert_problem_json(body)
+    assert body["errors"][0]["loc"] == "body.date"
+
+
+@pytest.mark.asyncio
+async def test_list_workouts_keyset_pagination(client):
+    for i, d in enumerate(["2025-09-03", "2025-09-01", "2025-09-02", "2025-09-01", "2025-09-04"]):
+        await client.post("/workouts", json={"title": f"W{i}", "date": d})
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = await client.get("/workouts", params=params)
+        assert r.status_code == 200
+        assert len(r.json()) <= 2
+        seen += [(w["date"], w["id"]) for w in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == sorted(seen) and len(seen) == 5
+
+
+@pytest.mark.asyncio
+async def test_list_workouts_rejects_bad_cursor_and_limit(client):
+    r = await client.get("/workouts", params={"cursor": "!!not-a-cursor"})
+    assert r.status_code == 422
+    await _assert_problem_json(r.json())
+    r = await client.get("/workouts", params={"limit": 0})
+    assert r.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_cursor_id_outside_index_key_is_rejected(client):
+    for _ in range(3):
+        await client.post("/workouts", json={"title": "W", "date": "2025-09-01"})
+        await client.post("/items", params={"name": "x"})
+    # id занимает младшие 40 бит ключа индекса дат: больший залез бы в биты дня
+    for wid in (-1, ROW_ID_LIMIT + 1, 10**23):
+        r = await client.get("/workouts", params={"cursor": encode_cursor("2025-09-01", wid)})
+        assert r.status_code == 422, (wid, r.text)
+        assert r.json()["errors"][0]["loc"] == "query.cursor"
+        r = await client.get("/items", params={"cursor": encode_cursor(wid)})
+        assert r.status_code == 422, (wid, r.text)
+    r = await client.get("/workouts", params={"cursor": encode_cursor("2025-09-01", 1)})
+    assert [w["id"] for w in r.json()] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_list_items_paginated(client):
+    for name in ["a", "b", "c"]:
+        await client.post("/items", params={"name": name})
+    r1 = await client.get("/items", params={"limit": 2})
+    assert [i["name"] for i in r1.json()] == ["a", "b"]
+    r2 = await client.get("/items", params={"limit": 2, "cursor": r1.headers["x-next-cursor"]})
+    assert [i["name"] for i in r2.json()] == ["c"]
+    assert "x-next-cursor" not in r2.headers
+
+
+@pytest.mark.asyncio
+async def test_export_workouts_ndjson(client, monkeypatch):
+    monkeypatch.setattr("app.api.routes.workouts.EXPORT_BATCH", 2)
+    for i, d in enumerate(["2025-09-03", "2025-09-01", "2025-09-02"]):
+        await client.post("/workouts", json={"title": f"W{i}", "date": d})
+
+    r = await client.get("/workouts/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [w["date"] for w in lines] == ["2025-09-01", "2025-09-02", "2025-09-03"]
+
+
+@pytest.mark.asyncio
+async def test_batch_create_patch_delete_with_per_row_problems(client):
+    r = await client.post(
+        "/workouts:batch",
+        json=[{"title": "A", "date": "2025-09-01"}, {"title": ""}, {"title": "B"}],
+        headers={"x-correlation-id": "batch-1"},
+    )
+    assert r.status_code == 200
+    res = r.json()["results"]
+    assert [x["status"] for x in res] == [201, 422, 201]
+    await _assert_problem_json(res[1]["problem"])
+    assert res[1]["problem"]["error_code"] == "validation_error"
+    assert res[1]["problem"]["correlation_id"] == "batch-1"
+    a_id, b_id = res[0]["data"]["id"], res[2]["data"]["id"]
+
+    r = await client.patch(
+        "/workouts:batch", json=[{"id": a_id, "notes": "n"}, {"id": 999, "notes": "x"}]
+    )
+    res = r.json()["results"]
+    assert [x["status"] for x in res] == [200, 404]
+    assert res[0]["data"]["notes"] == "n"
+    assert res[1]["problem"]["error_code"] == "not_found"
+
+    r = await client.request("DELETE", "/workouts:batch", json=[a_id, b_id, "x"])
+    assert [x["status"] for x in r.json()["results"]] == [204, 204, 422]
+    assert (await client.get("/workouts")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_workout_schema_defaults_and_patch_ignores_unknown_fields(client):
+    r = await client.post("/workouts", json={"title": "Run", "extra": "x"})
+    assert r.status_code == 201
+    w = r.json()
+    assert set(w) == {"id", "title", "notes", "duration_min", "date"}
+    assert w["duration_min"] == 1
+
+    r = await client.patch(f"/workouts/{w['id']}", json={"junk": "y" * 1000, "notes": "ok"})
+    assert r.status_code == 200
+    assert set(r.json()) == set(w)
+    assert set(get_db()["workouts"].get(w["id"])) == set(w)
+
+
+@pytest.mark.asyncio
+async def test_batch_row_validation_errors_match_request_validation(client):
+    r = await client.post("/workouts:batch", json=[{"title": "A", "duration_min": 0}])
+    (res,) = r.json()["results"]
+    assert res["status"] == 422
+    assert res["problem"]["errors"][0]["loc"] == "body.duration_min"
+    single = (await client.post("/workouts", json={"title": "A", "duration_min": 0})).json()
+    assert res["problem"]["errors"] == single["errors"]
+
+
+@pytest.mark.asyncio
+async def test_list_workouts_rejects_non_iso_date_bounds(client):
+    r = await client.get("/workouts", params={"date_from": "01.09.2025"})
+    assert r.status_code == 422
+    assert r.json()["error_code"] == "validation_error"
+    assert (await client.get("/workouts", params={"date_from": ""})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_workout_stats_grouped_by_period(client):
+    for d, dur in [("2025-09-01", 10), ("2025-09-07", 20), ("2025-09-08", 30), ("2025-10-02", 5)]:
+        await client.post("/workouts", json={"title": "W", "date": d, "duration_min": dur})
+
+    r = await client.get("/workouts/stats", params={"group_by": "week"})
+    assert r.status_code == 200
+    assert r.json() == [
+        {"period": "2025-09-01", "count": 2, "total_duration_min": 30},
+        {"period": "2025-09-08", "count": 1, "total_duration_min": 30},
+        {"period": "2025-09-29", "count": 1, "total_duration_min": 5},
+    ]
+    r = await client.get("/workouts/stats", params={"group_by": "month", "date_from": "2025-09-02"})
+    assert r.json() == [
+        {"period": "2025-09-01", "count": 2, "total_duration_min": 50},
+        {"period": "2025-10-01", "count": 1, "total_duration_min": 5},
+    ]
+    assert (await client.get("/workouts/stats", params={"group_by": "year"})).status_code == 422